@@ -30,6 +30,10 @@
 #define DEF_TIMEOUT 50 // Default radio listening timeout (in ms)
 #define ACK_TIMEOUT 25 // The amount of time (in ms) that should be spent sending an ACK (i.e., the instruction that was received) back to the RPi
 #define TEMP_SEND_PERIOD 3 // The amount of time (in sec) between each temperature data broadcast
+#define ECHO_ACK 1 // 1: ACK each instruction by sending it back to the RPi. 0: the NRF24L01+ hardware auto-ack is the ACK (set HARDWARE_ACK = True on the RPi)
+#define CHANNEL 125 // Radio channel [0, 125] => [2.400, 2.525] GHz, must match the RPi radio (see RADIOS in the RPi script) this node talks to
+#define NODE_ID 1 // 1-5: which RPi reading pipe this node transmits to (every Arduino talking to the same RPi needs its own, see nodes in the RPi script)
+#define TEMP_IN_ACK 0 // 1: don't send temperature packets, the latest reading rides in the ACK payload of whatever the RPi sends instead (set TEMP_IN_ACK = True on the RPi)
 
 RF24 radio(9, 10); // (CE, CSN) on NRF24L01+ chip
 
@@ -50,10 +54,13 @@ void setup()
   // Setup the NRF24L01+ Transceiver
   radio.begin();
   radio.setPALevel(RF24_PA_MAX);
-  radio.setChannel(125); // Channel possibilities: [0, 125] => [2.400, 2.525] GHz
-  radio.openReadingPipe(0, 0xC2C2C2C2C2);
-  radio.openWritingPipe(0xE7E7E7E7E7);
+  radio.setChannel(CHANNEL); // Channel possibilities: [0, 125] => [2.400, 2.525] GHz
+  radio.openReadingPipe(0, 0xC2C2C2C200LL | (0xC2 + NODE_ID - 1)); // NODE_ID 1: 0xC2C2C2C2C2
+  radio.openWritingPipe(0xE7E7E7E700LL | (0xE7 + NODE_ID - 1)); // NODE_ID 1: 0xE7E7E7E7E7
   radio.enableDynamicPayloads();
+#if TEMP_IN_ACK
+  radio.enableAckPayload();
+#endif
   radio.powerUp();
 }
 
@@ -160,12 +167,18 @@ bool listenForInstruction(int timeout)
   // If it has been, read/send temperature to the RPi with the NRF24L01+ chip
   readAndSendTemperature();
   
+  radio.startListening(); // (With ACK payloads enabled this also flushes the TX FIFO, so it's only called once here)
+#if TEMP_IN_ACK
+  loadTemperatureAck(); // Fresh reading for the next packet from the RPi
+#endif
   while(millis() - startTime <= timeout) // Listen until <timeout> (in ms) is reached
   {    
-    radio.startListening();
     if(radio.available()) // A new instruction was received
     {
       radio.read(&instruction, sizeof(instruction)); // Read the received message into <instruction>
+#if TEMP_IN_ACK
+      loadTemperatureAck(); // The one loaded before just went out in the ACK for this packet
+#endif
 
       // If we received [0, 0, 0, 0], that usually indicates a weak signal
       // Ignore this instruction and continue listening until <timeout> is reached
@@ -176,8 +189,10 @@ bool listenForInstruction(int timeout)
       }
 
       // Else, we received a non-zero instruction code. Stop listening and send an ACK back.
+      // (With ECHO_ACK set to 0 the hardware auto-ack has already confirmed it to the RPi.)
       else
       {
+#if ECHO_ACK
         radio.stopListening();
         // Acknowledge (ACK) instruction -- RPi will wait up to 50 ms (or whatever its <ACK_TIMEOUT> is set to) 
         startTime = millis();
@@ -189,6 +204,7 @@ bool listenForInstruction(int timeout)
           // then the RPi will resend the instruction (or a new instruction if it has one ready)
           radio.write(&instruction, sizeof(instruction));
         }
+#endif
         return true; // Return true since we have received a new instruction
       }
     }
@@ -198,8 +214,18 @@ bool listenForInstruction(int timeout)
   return false;
 }
 
+void loadTemperatureAck()
+{
+  // Preload the ACK payload (pipe 0) with the current raw temperature reading -- only need two bytes
+  tempSensorVal = analogRead(A0); // Read temperature -- always in range [0, 1023]
+  radio.writeAckPayload(0, &tempSensorVal, 2);
+}
+
 void readAndSendTemperature()
 {
+#if TEMP_IN_ACK
+  return; // Temperature goes out in ACK payloads instead (see loadTemperatureAck())
+#endif
   // Return true if we just sent a value, else return false
   // If it's been at least <TEMP_SEND_PERIOD> seconds since temperature data was last sent, send it (avoids sending a bunch of temp data per second)
   if(millis() - lastTempSend >= TEMP_SEND_PERIOD*1000)
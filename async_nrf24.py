@@ -0,0 +1,154 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# asyncio front end for lib_nrf24.NRF24.
+#
+# One AsyncNRF24 owns one radio inside one event loop: LED commands, pattern timing and temperature
+# ingestion can all be coroutines instead of processes/threads busy-waiting on the radio.
+#
+#     async def main():
+#         async with AsyncNRF24(radio, irq_pin=24) as nrf:
+#             await nrf.send_and_confirm(bytes([1, 255, 0, 0]), timeout=0.5)
+#             async for pipe, payload in nrf:
+#                 print(pipe, payload)
+#
+# The radio stays in RX mode and is only switched to TX for the duration of a send(). SPI work runs on
+# a single worker thread (so it never blocks the loop, and is serialised); incoming packets are picked
+# up on the IRQ line (GPIO edge callback -> loop.call_soon_threadsafe) or, without IRQ, by polling with
+# an interval that backs off while the air is quiet and resets as soon as something arrives.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from lib_nrf24 import NRF24
+
+
+class AsyncNRF24:
+    def __init__(self, radio, irq_pin=0, poll_interval=0.0005, max_poll_interval=0.02, queue_size=0):
+        self.radio = radio
+        self.irq_pin = irq_pin
+        self.poll_interval = poll_interval # Fastest polling interval (s), used right after traffic
+        self.max_poll_interval = max_poll_interval # Slowest polling interval (s), also the IRQ safety net
+        self.queue = asyncio.Queue(queue_size) # Incoming (pipe, payload) not claimed by send_and_confirm()
+        self.executor = ThreadPoolExecutor(max_workers=1) # All SPI traffic goes through this one thread
+        self.lock = asyncio.Lock() # One send at a time
+        self.confirm_waiters = [] # [(payload, future)] for send_and_confirm()
+        self.irq_event = asyncio.Event()
+        self.loop = None
+        self.reader = None
+        self.dropped = 0 # Packets dropped because <queue> was full
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.recv()
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        if self.irq_pin:
+            gpio = self.radio.GPIO
+            gpio.setup(self.irq_pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+            gpio.add_event_detect(self.irq_pin, gpio.FALLING, callback=self._irq_edge)
+        await self._run(self.radio.startListening)
+        self.reader = self.loop.create_task(self._read_loop())
+
+    async def close(self):
+        if self.reader is not None:
+            self.reader.cancel()
+            try:
+                await self.reader
+            except asyncio.CancelledError:
+                pass
+            self.reader = None
+        if self.irq_pin:
+            self.radio.GPIO.remove_event_detect(self.irq_pin)
+        self.executor.shutdown(wait=True)
+
+    async def send(self, payload):
+        # Transmit one payload. Returns True if the receiver's hardware auto-ack came back.
+        async with self.lock:
+            return await self._run(self._send, bytes(payload))
+
+    async def recv(self):
+        # Next incoming (pipe, payload)
+        return await self.queue.get()
+
+    async def send_and_confirm(self, payload, timeout=0.1, resend_interval=0.1):
+        # The script's send_message() + wait_for_ACK() protocol: send <payload> until the node echoes
+        # it back, re-sending every <resend_interval> s. Returns False if <timeout> s pass first.
+        payload = bytes(payload)
+        future = self.loop.create_future()
+        waiter = (payload, future)
+        self.confirm_waiters.append(waiter)
+        try:
+            deadline = self.loop.time() + timeout
+            while True:
+                await self.send(payload)
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    return future.done()
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), min(resend_interval, remaining))
+                    return True
+                except asyncio.TimeoutError:
+                    if self.loop.time() >= deadline:
+                        return False
+        finally:
+            self.confirm_waiters.remove(waiter)
+
+    # Radio side
+
+    def _send(self, payload):
+        # Runs on the executor thread: keep what's already in the RX FIFO (stopListening() would flush it)
+        packets = self.radio.drain()
+        self.radio.ce(NRF24.LOW)
+        result = self.radio.write(payload)
+        self.radio.startListening()
+        if packets:
+            self.loop.call_soon_threadsafe(self._deliver, packets)
+        return bool(result)
+
+    async def _run(self, func, *args):
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    def _irq_edge(self, pin):
+        # GPIO thread
+        self.loop.call_soon_threadsafe(self.irq_event.set)
+
+    async def _read_loop(self):
+        interval = self.poll_interval
+        while True:
+            self.irq_event.clear()
+            packets = await self._run(self.radio.drain)
+            if packets:
+                self._deliver(packets)
+                interval = self.poll_interval
+                continue
+            if self.irq_pin:
+                try:
+                    await asyncio.wait_for(self.irq_event.wait(), self.max_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(interval)
+                interval = min(interval * 2, self.max_poll_interval)
+
+    def _deliver(self, packets):
+        for pipe, payload in packets:
+            for expected, future in self.confirm_waiters:
+                if payload == expected and not future.done():
+                    future.set_result(pipe)
+                    break
+            else:
+                try:
+                    self.queue.put_nowait((pipe, payload))
+                except asyncio.QueueFull:
+                    self.dropped += 1
@@ -0,0 +1,255 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Benchmarks for the lib_nrf24.NRF24 hot paths with SPI transaction accounting.
+#
+# Every benchmark runs against a RecordingSpiDev which counts the spidev.xfer2() calls and bytes made
+# by the radio under test. By default the radio is an emulated nRF24L01+ (see nrf24_emulator.py)
+# talking to an emulated Arduino, so the numbers measure the Python/SPI side only and can be compared
+# between changes on any machine:
+#
+#     python3 bench_nrf24.py                        # all benchmarks
+#     python3 bench_nrf24.py -n 5000 write read     # selected benchmarks
+#     python3 bench_nrf24.py --save before.json     # ... then later
+#     python3 bench_nrf24.py --compare before.json
+#     python3 bench_nrf24.py --hardware write       # real spidev + RPi.GPIO (CE on GPIO17)
+#     python3 bench_nrf24.py --register-cache       # with NRF24.enableRegisterCache()
+
+import sys
+import json
+import time
+import argparse
+
+from lib_nrf24 import NRF24
+from transceiver import Transceiver
+from nrf24_emulator import Air, ArduinoPeer, EmulatedGPIO, EmulatedSpiDev
+
+readPipeAddr = [0xe7, 0xe7, 0xe7, 0xe7, 0xe7]
+writePipeAddr = [0xc2, 0xc2, 0xc2, 0xc2, 0xc2]
+INSTRUCTION = bytes([1, 255, 0, 0])
+
+
+class RecordingSpiDev:
+    """Wraps a spidev object and counts the xfer2() transactions and bytes going through it."""
+
+    def __init__(self, spidev):
+        self.__dict__["spidev"] = spidev
+        self.reset()
+
+    def reset(self):
+        self.__dict__.update(calls=0, bytes=0)
+
+    def xfer2(self, data):
+        self.__dict__["calls"] += 1
+        self.__dict__["bytes"] += len(data)
+        return self.spidev.xfer2(data)
+
+    def xfer(self, data):
+        return self.xfer2(data)
+
+    def __getattr__(self, name):
+        return getattr(self.spidev, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.spidev, name, value) # e.g. max_speed_hz set in NRF24.begin()
+
+
+def configure_radio(radio, ce_pin=17):
+    # Same set up as Transceiver.setup_radio(), without the register cache
+    radio.begin(0, ce_pin)
+    radio.setPayloadSize(32)
+    radio.setChannel(125)
+    radio.setDataRate(NRF24.BR_1MBPS)
+    radio.setPALevel(NRF24.PA_MAX)
+    radio.setAutoAck(True)
+    radio.enableDynamicPayloads()
+    radio.enableAckPayload()
+    radio.openReadingPipe(1, readPipeAddr)
+    radio.openWritingPipe(writePipeAddr)
+    return radio
+
+
+class Bench:
+    """One radio under test (behind a RecordingSpiDev, set up by the RPi script's Transceiver) plus, when
+    emulated, an Arduino peer and a second emulated radio (<sender>) used to feed packets to it."""
+
+    def __init__(self, hardware=False, register_cache=False):
+        self.hardware = hardware
+        if hardware:
+            import spidev
+            import RPi.GPIO as GPIO
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setwarnings(False)
+            self.gpio = GPIO
+            self.spi = RecordingSpiDev(spidev.SpiDev())
+            self.air = self.peer = self.sender = None
+        else:
+            self.air = Air()
+            self.gpio = EmulatedGPIO()
+            self.spi = RecordingSpiDev(EmulatedSpiDev(self.air, self.gpio, ce_pin=17, irq_pin=24))
+            self.peer = ArduinoPeer(self.air, temp_period=0)
+            self.sender = configure_radio(NRF24(self.gpio, EmulatedSpiDev(self.air, self.gpio, ce_pin=27)), 27)
+            self.sender.openWritingPipe(readPipeAddr)
+            self.sender.openReadingPipe(1, writePipeAddr)
+            self.sender.stopListening()
+        self.transceiver = Transceiver(gpio=self.gpio, spidev_factory=lambda: self.spi, link_quality=False) # Just the protocol's SPI traffic
+        self.radio = self.transceiver.get_radio(0)
+        if not register_cache:
+            self.radio.disableRegisterCache()
+
+    def feed(self, payload=INSTRUCTION):
+        # Put one packet in the radio's RX FIFO (the sender's SPI traffic isn't counted)
+        self.sender.write(payload)
+
+
+# Each benchmark takes a Bench and returns (op, prepare): <op> is timed and its SPI traffic counted,
+# <prepare> (may be None) runs untimed and uncounted before every <op>.
+
+def bench_write(b):
+    b.radio.stopListening()
+    return (lambda: b.radio.write(INSTRUCTION)), None # Acked by the emulated Arduino
+
+def bench_available(b):
+    b.radio.startListening()
+    return (lambda: b.radio.available(0)), None
+
+def bench_read(b):
+    b.radio.startListening()
+    def op():
+        if b.radio.available(0):
+            received_message = []
+            b.radio.read(received_message, b.radio.getDynamicPayloadSize())
+    return op, b.feed
+
+def bench_write_bytes(b):
+    b.radio.stopListening()
+    payload = bytearray(INSTRUCTION)
+    return (lambda: b.radio.write_bytes(memoryview(payload))), None # Payload load only (no CE pulse)
+
+def bench_read_into(b):
+    b.radio.startListening()
+    buf = bytearray(NRF24.MAX_PAYLOAD_SIZE)
+    def op():
+        if b.radio.available(0):
+            b.radio.read_into(buf, b.radio.getDynamicPayloadSize())
+    return op, b.feed
+
+def bench_recv(b):
+    b.radio.startListening()
+    return (lambda: b.radio.recv()), b.feed
+
+def bench_drain(b):
+    b.radio.startListening()
+    def prepare():
+        for i in range(3):
+            b.feed()
+    return (lambda: b.radio.drain()), prepare # Full FIFO, 3 packets per op
+
+def bench_tx_stream(b):
+    b.radio.stopListening()
+    frames = [bytes([1, i, 0, 0]) for i in range(30)]
+    return (lambda: b.radio.tx_stream(frames)), None # 30 frames per op, compare with 30 x write
+
+def bench_listen_switch(b):
+    def op():
+        b.radio.startListening()
+        b.radio.stopListening()
+    return op, None
+
+def bench_transceive(b):
+    return (lambda: b.transceiver.transceive(*INSTRUCTION)), None # One menu command, from send to listening again
+
+def bench_transceive_hw_ack(b):
+    b.peer.echo_ack = False
+    b.transceiver.hardware_ack = True
+    return (lambda: b.transceiver.transceive(*INSTRUCTION)), None
+
+BENCHMARKS = {
+    "write": (bench_write, False),
+    "available": (bench_available, False),
+    "read": (bench_read, True),
+    "write_bytes": (bench_write_bytes, False),
+    "read_into": (bench_read_into, True),
+    "recv": (bench_recv, True),
+    "drain": (bench_drain, True),
+    "tx_stream_30": (bench_tx_stream, False),
+    "listen_switch": (bench_listen_switch, False),
+    "transceive": (bench_transceive, True),
+    "transceive_hw_ack": (bench_transceive_hw_ack, True),
+}
+# name -> (benchmark, needs the emulator)
+
+
+def run(name, iterations, hardware=False, register_cache=False):
+    bench = BENCHMARKS[name][0]
+    b = Bench(hardware, register_cache)
+    op, prepare = bench(b)
+    latencies = []
+    calls = nbytes = 0
+    for i in range(iterations):
+        if prepare:
+            prepare()
+        b.spi.reset()
+        t0 = time.perf_counter()
+        op()
+        latencies.append(time.perf_counter() - t0)
+        calls += b.spi.calls
+        nbytes += b.spi.bytes
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "name": name,
+        "iterations": iterations,
+        "ops_per_sec": iterations / total if total else float("inf"),
+        "mean_us": total / iterations * 1e6,
+        "p50_us": latencies[iterations // 2] * 1e6,
+        "p99_us": latencies[min(iterations - 1, int(iterations * 0.99))] * 1e6,
+        "xfer2_per_op": calls / iterations,
+        "bytes_per_op": nbytes / iterations,
+    }
+
+
+def print_report(results, baseline=None):
+    header = "%-16s %10s %10s %10s %10s %8s %8s" % ("benchmark", "ops/s", "mean us", "p50 us", "p99 us", "xfer2", "bytes")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print("%-16s %10.0f %10.1f %10.1f %10.1f %8.1f %8.1f" % (
+            r["name"], r["ops_per_sec"], r["mean_us"], r["p50_us"], r["p99_us"], r["xfer2_per_op"], r["bytes_per_op"]))
+        old = (baseline or {}).get(r["name"])
+        if old:
+            print("%-16s %+9.0f%% %+9.0f%% %21s %+8.1f %+8.1f" % (
+                "  vs baseline", (r["ops_per_sec"] / old["ops_per_sec"] - 1) * 100,
+                (r["mean_us"] / old["mean_us"] - 1) * 100, "",
+                r["xfer2_per_op"] - old["xfer2_per_op"], r["bytes_per_op"] - old["bytes_per_op"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark lib_nrf24.NRF24 hot paths")
+    parser.add_argument("benchmarks", nargs="*", help="any of: " + ", ".join(BENCHMARKS))
+    parser.add_argument("-n", "--iterations", type=int, default=2000)
+    parser.add_argument("--hardware", action="store_true", help="use spidev + RPi.GPIO instead of the emulator")
+    parser.add_argument("--register-cache", action="store_true", help="enable NRF24's shadow register cache")
+    parser.add_argument("--save", metavar="FILE", help="save results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare against results saved with --save")
+    args = parser.parse_args(argv)
+
+    names = args.benchmarks or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark: " + name)
+    if args.hardware:
+        names = [name for name in names if not BENCHMARKS[name][1]] # These need the emulated peers
+
+    results = [run(name, args.iterations, args.hardware, args.register_cache) for name in names]
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = dict((r["name"], r) for r in json.load(f))
+    print_report(results, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -24,8 +24,11 @@
 #
 
 
+import os
 import sys
 import time
+import threading
+import collections
 
 if __name__ == '__main__':
     print (sys.argv[0], 'is an importable module:')
@@ -176,6 +179,11 @@ class NRF24:
 
     child_payload_size = [RX_PW_P0, RX_PW_P1, RX_PW_P2, RX_PW_P3, RX_PW_P4, RX_PW_P5]
     child_pipe_enable = [ERX_P0, ERX_P1, ERX_P2, ERX_P3, ERX_P4, ERX_P5]
+    # Configuration registers that only change when we write them (see enableRegisterCache)
+    shadow_registers = [CONFIG, EN_AA, EN_RXADDR, SETUP_RETR, RF_CH, RF_SETUP, DYNPD, FEATURE]
+    zero_pad = [0x00] * MAX_PAYLOAD_SIZE
+    status_cmd = [NOP]
+    payload_width_cmd = [R_RX_PL_WID, NOP]
 
     GPIO = None
     spidev = None
@@ -195,6 +203,20 @@ class NRF24:
         self.dynamic_payloads_enabled = False #*< Whether dynamic payloads are enabled.
         self.ack_payload_length = 5 #*< Dynamic size of pending ack payload.
         self.pipe0_reading_address = None #*< Last address set on pipe 0 for reading.
+        self.tx_address = None #*< Address last written to TX_ADDR (register cache only).
+        self.rx_p0_address = None #*< Address last written to RX_ADDR_P0 (register cache only).
+        self.irq_pin = 0 #*< GPIO pin wired to the (active low) IRQ line, 0 if not used.
+        self.irq_wait = None #*< Pluggable wait primitive: irq_wait(timeout_s) -> True if the IRQ fired.
+        self.irq_event = None
+        self.irq_pid = None
+        self.shadow = None #*< Write-through copy of shadow_registers, None if the cache is off.
+        self.last_status = 0 #*< STATUS byte clocked out by the last recv() transfer.
+        self.rx_fifo_full_count = 0 #*< Number of drain() wakeups that found the RX FIFO full (packets may have been dropped).
+        self.tx_pending = collections.deque() #*< (tag, payload) queued by write_fast() and not resolved yet, oldest first.
+        self.fast_write_active = False #*< PTX with CE held high (write_fast / tx_stream).
+        # Preallocated SPI transfer buffers, indexed by payload length (see write_bytes / read_into)
+        self.tx_buffers = [[NRF24.W_TX_PAYLOAD] + [0x00] * n for n in range(NRF24.MAX_PAYLOAD_SIZE + 1)]
+        self.rx_buffers = [[NRF24.R_RX_PAYLOAD] + [NRF24.NOP] * n for n in range(NRF24.MAX_PAYLOAD_SIZE + 1)]
 
     def ce(self, level):
         if self.ce_pin == 0:
@@ -211,12 +233,20 @@ class NRF24:
 
 
     def read_register(self, reg, blen=1):
+        if self.shadow is not None and blen == 1 and reg in self.shadow:
+            return self.shadow[reg]
+        return self.read_register_hw(reg, blen)
+
+    def read_register_hw(self, reg, blen=1):
+        # Always asks the chip (and refreshes the shadow copy, if there is one)
         buf = [NRF24.R_REGISTER | ( NRF24.REGISTER_MASK & reg )]
         for col in range(blen):
             buf.append(NRF24.NOP)
 
         resp = self.spidev.xfer2(buf)
         if blen == 1:
+            if self.shadow is not None and reg in NRF24.shadow_registers:
+                self.shadow[reg] = resp[1]
             return resp[1]
 
         return resp[1:blen + 1]
@@ -227,6 +257,8 @@ class NRF24:
         if isinstance(value, int):
             if length < 0:
                 length = 1
+            if self.shadow is not None and length == 1 and reg in NRF24.shadow_registers:
+                self.shadow[reg] = value & 0xff
 
             length = min(4, length)
             for i in range(length):
@@ -245,7 +277,31 @@ class NRF24:
         return self.spidev.xfer2(buf)[0]
 
 
+    def enableRegisterCache(self):
+        # Keep a write-through copy of the configuration registers so the read-modify-write
+        # sequences (startWrite, startListening, powerUp, openReadingPipe, ...) become single
+        # SPI writes. Only valid while nobody else writes to the chip: call resync() if it may
+        # have been reset (e.g. brown-out) or reconfigured behind our back.
+        self.shadow = {}
+        self.resync()
+
+    def disableRegisterCache(self):
+        self.shadow = None
+        self.tx_address = self.rx_p0_address = None
+
+    def resync(self):
+        # Reload the shadow copy from the chip
+        self.tx_address = self.rx_p0_address = None
+        if self.shadow is None:
+            return
+        self.shadow.clear()
+        for reg in NRF24.shadow_registers:
+            self.read_register_hw(reg)
+
     def write_payload(self, buf):
+        if isinstance(buf, (bytes, bytearray, memoryview)):
+            return self.write_bytes(buf)
+
         data_len = min(self.payload_size, len(buf))
         blank_len = 0
         if not self.dynamic_payloads_enabled:
@@ -275,12 +331,35 @@ class NRF24:
         if not self.dynamic_payloads_enabled:
             blank_len = self.payload_size - data_len
 
-        txbuffer = [NRF24.NOP for i in range(0, blank_len + data_len + 1)]
-        txbuffer[0] = NRF24.R_RX_PAYLOAD
+        payload = self.spidev.xfer2(self.rx_buffers[blank_len + data_len])
+        buf[:] = payload[1:data_len + 1]
+        return data_len
+
+    def write_bytes(self, buf):
+        # write_payload() for bytes-like objects (bytes, bytearray, memoryview, array): the payload is
+        # copied into a preallocated transfer buffer with one slice assignment, not byte by byte.
+        data = memoryview(buf).cast('B')
+        data_len = min(self.payload_size, data.nbytes)
+        total_len = data_len if self.dynamic_payloads_enabled else self.payload_size
 
-        payload = self.spidev.xfer2(txbuffer)
-        del buf[:]
-        buf.extend(payload[1:data_len + 1])
+        txbuffer = self.tx_buffers[total_len]
+        txbuffer[1:data_len + 1] = data[:data_len]
+        if total_len > data_len:
+            txbuffer[data_len + 1:] = NRF24.zero_pad[:total_len - data_len]
+
+        return self.spidev.xfer2(txbuffer)
+
+    def read_into(self, buf, buf_len=-1):
+        # read_payload() into a writable bytes-like object (bytearray, memoryview, array) that the
+        # caller can reuse for every packet. Returns the number of bytes written to <buf>.
+        view = memoryview(buf).cast('B')
+        if buf_len < 0:
+            buf_len = view.nbytes
+        data_len = min(self.payload_size, buf_len, view.nbytes)
+        total_len = data_len if self.dynamic_payloads_enabled else self.payload_size
+
+        payload = self.spidev.xfer2(self.rx_buffers[total_len])
+        view[:data_len] = bytes(payload[1:data_len + 1])
         return data_len
 
     def flush_rx(self):
@@ -290,7 +369,7 @@ class NRF24:
         return self.spidev.xfer2([NRF24.FLUSH_TX])[0]
 
     def get_status(self):
-        return self.spidev.xfer2([NRF24.NOP])[0]
+        return self.spidev.xfer2(NRF24.status_cmd)[0]
 
     def print_status(self, status):
         status_str = "STATUS\t = 0x{0:02x} RX_DR={1:x} TX_DS={2:x} MAX_RT={3:x} RX_P_NO={4:x} TX_FULL={5:x}".format(
@@ -365,14 +444,16 @@ class NRF24:
         print ("CRC Length\t = %s" % NRF24.crclength_e_str_P[self.getCRCLength()])
         print ("PA Power\t = %s" % NRF24.pa_dbm_e_str_P[self.getPALevel()])
 
-    def begin(self, csn_pin, ce_pin=0):   # csn & ce are RF24 terminology. csn = SPI's CE!
+    def begin(self, csn_pin, ce_pin=0, bus=0):   # csn & ce are RF24 terminology. csn = SPI's CE!
         # Initialize SPI bus..
         # ce_pin is for the rx=listen or tx=trigger pin on RF24 (they call that ce !!!)
         # CE optional (at least in some circumstances, eg fixed PTX PRX roles, no powerdown)
         # CE seems to hold itself as (sufficiently) HIGH, but tie HIGH is safer!
-        self.spidev.open(0, csn_pin)
+        # bus: SPI bus (0: /dev/spidev0.<csn_pin>, 1: the auxiliary SPI1 bus, /dev/spidev1.<csn_pin>, needs dtoverlay=spi1-2cs)
+        self.spidev.open(bus, csn_pin)
         self.spidev.max_speed_hz = 4000000
         self.ce_pin = ce_pin
+        self.resync() # The chip may hold anything at this point
 
         if ce_pin:
             self.GPIO.setup(self.ce_pin, self.GPIO.OUT)
@@ -428,7 +509,7 @@ class NRF24:
 
         # Restore the pipe0 address, if exists
         if self.pipe0_reading_address:
-            self.write_register(self.RX_ADDR_P0, self.pipe0_reading_address, 5)
+            self.write_address(NRF24.RX_ADDR_P0, self.pipe0_reading_address)
 
         # Go!
         self.ce(NRF24.HIGH)
@@ -478,6 +559,114 @@ class NRF24:
 
         return result
 
+    def write_fast(self, buf, tag=None):
+        # Pipelined write(): queue <buf> in the 3-deep TX FIFO and hold CE high, so the chip sends it
+        # as soon as the payloads ahead of it are through. Returns False (nothing queued) if the FIFO
+        # is full or a MAX_RT still has to be handled; call tx_results() to make room.
+        status = self.get_status()
+        if status & (_BV(NRF24.TX_FULL) | _BV(NRF24.MAX_RT)):
+            if self.tx_pending:
+                return False
+            # None of it is ours (e.g. left behind by a startWrite() nobody acked): tx_results() would never clear it
+            self.flush_tx()
+            self.write_register(NRF24.STATUS, _BV(NRF24.TX_DS) | _BV(NRF24.MAX_RT))
+
+        if not self.fast_write_active:
+            self.write_register(NRF24.CONFIG, (self.read_register(NRF24.CONFIG) | _BV(NRF24.PWR_UP)) & ~_BV(NRF24.PRIM_RX))
+            self.fast_write_active = True
+        self.write_payload(buf)
+        self.tx_pending.append((tag, buf))
+        if len(self.tx_pending) == 1:
+            self.ce(NRF24.HIGH) # Stays high: the chip keeps sending while the TX FIFO has data
+        return True
+
+    def tx_results(self):
+        # Outcomes of write_fast() payloads resolved since the last call, oldest first: [(tag, ok)].
+        # Each TX_DS is one delivered payload. If more than one was delivered between two calls the
+        # extra ones are picked up once the FIFO reads empty, so results may lag but never misreport,
+        # as long as this is called at least once per packet time when MAX_RT matters.
+        results = []
+        if not self.tx_pending:
+            return results
+
+        status = self.get_status()
+        flags = status & (_BV(NRF24.TX_DS) | _BV(NRF24.MAX_RT))
+        if not flags:
+            return results
+        if status & _BV(NRF24.MAX_RT):
+            # The head of the FIFO ran out of retries. There's no way to drop just that one payload,
+            # so flush (before clearing MAX_RT, which would restart it) and load the ones behind it
+            # again below (CE is still high, they go straight out).
+            self.flush_tx()
+        self.write_register(NRF24.STATUS, flags)
+
+        if status & _BV(NRF24.TX_DS):
+            results.append((self.tx_pending.popleft()[0], True))
+
+        if status & _BV(NRF24.MAX_RT):
+            results.append((self.tx_pending.popleft()[0], False))
+            for tag, buf in self.tx_pending:
+                self.write_payload(buf)
+        elif self.tx_pending and self.read_register(NRF24.FIFO_STATUS) & _BV(NRF24.TX_EMPTY):
+            # Several TX_DS merged into one: everything still pending has gone out
+            while self.tx_pending:
+                results.append((self.tx_pending.popleft()[0], True))
+        return results
+
+    def tx_flush(self, timeout=None):
+        # Wait until every write_fast() payload is resolved (or <timeout> s pass without progress,
+        # then the rest count as failed), drop CE and return the remaining results.
+        if timeout is None:
+            timeout = self.getMaxTimeout()
+        results = []
+        progress_at = time.time()
+        while self.tx_pending:
+            resolved = self.tx_results()
+            if resolved:
+                results.extend(resolved)
+                progress_at = time.time()
+            elif time.time() - progress_at > timeout:
+                self.flush_tx()
+                self.write_register(NRF24.STATUS, _BV(NRF24.TX_DS) | _BV(NRF24.MAX_RT)) # Don't leave them for write_fast() to trip over
+                while self.tx_pending:
+                    results.append((self.tx_pending.popleft()[0], False))
+            else:
+                time.sleep(10 / 1000000.0)
+        self.ce(NRF24.LOW)
+        self.fast_write_active = False
+        return results
+
+    def tx_stream(self, payloads, on_result=None, timeout=None):
+        # Send every payload in <payloads> keeping up to three in flight. on_result(index, ok) is called
+        # for each one as its outcome becomes known (in order). Returns the number delivered.
+        if timeout is None:
+            timeout = self.getMaxTimeout()
+        delivered = [0]
+
+        def report(results):
+            for tag, ok in results:
+                if ok:
+                    delivered[0] += 1
+                if on_result is not None:
+                    on_result(tag, ok)
+
+        for index, buf in enumerate(payloads):
+            progress_at = time.time()
+            while not self.write_fast(buf, index):
+                results = self.tx_results()
+                if results:
+                    report(results)
+                    progress_at = time.time()
+                elif time.time() - progress_at > timeout:
+                    if not self.tx_pending:
+                        report([(index, False)]) # The chip won't take it and nothing of ours is in the way: give up on it
+                        break
+                    report(self.tx_flush(0))
+                    progress_at = time.time()
+            report(self.tx_results())
+        report(self.tx_flush(timeout))
+        return delivered[0]
+
     def startWrite(self, buf):
         # Transmitter power-up
         self.write_register(NRF24.CONFIG, (self.read_register(NRF24.CONFIG) | _BV(NRF24.PWR_UP) ) & ~_BV(NRF24.PRIM_RX))
@@ -498,7 +687,7 @@ class NRF24:
 
 
     def getDynamicPayloadSize(self):
-        return self.spidev.xfer2([NRF24.R_RX_PL_WID, NRF24.NOP])[1]
+        return self.spidev.xfer2(NRF24.payload_width_cmd)[1]
 
     def available(self, pipe_num=None):
         if not pipe_num:
@@ -529,6 +718,138 @@ class NRF24:
 
         return result
 
+    def enableIRQ(self, irq_pin=0, wait=None):
+        # Wait on the IRQ line instead of polling STATUS over SPI (see waitForIRQ / waitAvailable).
+        # <wait> replaces GPIO edge detection, e.g. for a board without RPi.GPIO style event detect.
+        self.irq_pin = irq_pin
+        self.irq_wait = wait
+        self.irq_pid = None
+        if irq_pin:
+            self.GPIO.setup(irq_pin, self.GPIO.IN, pull_up_down=self.GPIO.PUD_UP)
+
+    def disableIRQ(self):
+        if self.irq_pin and self.irq_pid is not None:
+            self.GPIO.remove_event_detect(self.irq_pin)
+        self.irq_pin = 0
+        self.irq_wait = None
+        self.irq_pid = None
+
+    def _irq_edge(self, pin):
+        self.irq_event.set()
+
+    def waitForIRQ(self, timeout=None):
+        # Block until RX_DR, TX_DS or MAX_RT is raised (IRQ low), or <timeout> seconds pass.
+        # Returns True if an interrupt is pending. Costs no SPI traffic.
+        if self.irq_wait is not None:
+            return self.irq_wait(timeout)
+        if not self.irq_pin:
+            raise Exception("IRQ pin not enabled, call enableIRQ() first")
+
+        # Edge detection runs on a GPIO thread, which doesn't survive a fork: (re)arm it per process
+        if self.irq_pid != os.getpid():
+            try:
+                self.GPIO.remove_event_detect(self.irq_pin)
+            except Exception:
+                pass
+            self.irq_event = threading.Event()
+            self.GPIO.add_event_detect(self.irq_pin, self.GPIO.FALLING, callback=self._irq_edge)
+            self.irq_pid = os.getpid()
+
+        self.irq_event.clear()
+        # The line may have gone low before the edge detect was armed (level check after clear())
+        if self.GPIO.input(self.irq_pin) == self.GPIO.LOW:
+            return True
+        return self.irq_event.wait(timeout)
+
+    def waitAvailable(self, timeout=None, pipe_num=None, poll_interval=1/1000.0):
+        # available(), but sleeps on the IRQ line in between checks (or polls every <poll_interval>
+        # seconds if no IRQ pin is enabled). Returns False if nothing arrived within <timeout> seconds.
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if self.available(pipe_num):
+                return True
+            if not self._wait_step(deadline, poll_interval):
+                return False
+
+    def _wait_step(self, deadline, poll_interval):
+        # Sleep until the next IRQ (or for one poll interval). Returns False once <deadline> has passed.
+        remaining = None if deadline is None else deadline - time.time()
+        if remaining is not None and remaining <= 0:
+            return False
+        if self.irq_pin or self.irq_wait is not None:
+            self.waitForIRQ(remaining)
+        else:
+            time.sleep(poll_interval if remaining is None else min(poll_interval, remaining))
+        return True
+
+    def recv(self):
+        # Fetch the next received packet as (pipe, payload bytes), or None if the RX FIFO is empty.
+        # Costs 2 SPI transfers per packet: the STATUS byte clocked out with R_RX_PL_WID tells us
+        # whether the FIFO holds anything (RX_P_NO != 0b111) and which pipe it came in on, and the
+        # payload read pops it. RX_DR is only cleared once the FIFO has been found empty, so the IRQ
+        # line stays asserted while packets are still queued.
+        while True:
+            if self.dynamic_payloads_enabled:
+                resp = self.spidev.xfer2(NRF24.payload_width_cmd)
+                status, data_len = resp[0], resp[1]
+            else:
+                status, data_len = self.spidev.xfer2(NRF24.status_cmd)[0], self.payload_size
+            self.last_status = status
+
+            pipe = (status >> NRF24.RX_P_NO) & 0b111
+            if pipe != 0b111:
+                break
+
+            # Drained: acknowledge RX_DR (and TX_DS from a sent ack payload) now, not before
+            flags = status & (_BV(NRF24.RX_DR) | _BV(NRF24.TX_DS))
+            if not flags:
+                return None
+            status = self.write_register(NRF24.STATUS, flags)
+            if (status >> NRF24.RX_P_NO) & 0b111 == 0b111:
+                return None
+            # A packet landed between the two transfers, go round again
+
+        if data_len > NRF24.MAX_PAYLOAD_SIZE:
+            # Corrupt width, the datasheet says to flush
+            self.flush_rx()
+            return None
+        payload = self.spidev.xfer2(self.rx_buffers[data_len])
+        return pipe, bytes(payload[1:data_len + 1])
+
+    def waitRecv(self, timeout=None, poll_interval=1/1000.0):
+        # recv(), sleeping on the IRQ line (or polling) until a packet arrives or <timeout> seconds pass
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            packet = self.recv()
+            if packet is not None:
+                return packet
+            if not self._wait_step(deadline, poll_interval):
+                return None
+
+    def drain(self):
+        # Empty the whole (3-deep) RX FIFO in one call. Returns a list of (pipe, payload bytes).
+        # FIFO_STATUS is read once per call to count RX FIFO full events; after that the RX_P_NO
+        # bits of the STATUS byte that comes with every recv() transfer say when it's empty.
+        if self.read_register(NRF24.FIFO_STATUS) & _BV(NRF24.RX_FULL):
+            self.rx_fifo_full_count += 1
+        packets = []
+        while True:
+            packet = self.recv()
+            if packet is None:
+                return packets
+            packets.append(packet)
+
+    def waitDrain(self, timeout=None, poll_interval=1/1000.0):
+        # drain(), sleeping on the IRQ line (or polling) until there is at least one packet or <timeout>
+        # seconds pass (then returns [])
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            packets = self.drain()
+            if packets:
+                return packets
+            if not self._wait_step(deadline, poll_interval):
+                return packets
+
     def read(self, buf, buf_len=-1):
         # Fetch the payload
         self.read_payload(buf, buf_len)
@@ -551,11 +872,33 @@ class NRF24:
         # Note that the NRF24L01(+)
         # expects it LSB first.
 
-        self.write_register(NRF24.RX_ADDR_P0, value, 5)
-        self.write_register(NRF24.TX_ADDR, value, 5)
-
-        max_payload_size = 32
-        self.write_register(NRF24.RX_PW_P0, min(self.payload_size, max_payload_size))
+        # With the register cache on, switching between nodes only writes the address bytes that changed
+        # (and nothing at all if <value> is already the writing pipe).
+        first_open = self.tx_address is None
+        self.write_address(NRF24.RX_ADDR_P0, value)
+        self.write_address(NRF24.TX_ADDR, value)
+
+        if first_open:
+            max_payload_size = 32
+            self.write_register(NRF24.RX_PW_P0, min(self.payload_size, max_payload_size))
+
+    def write_address(self, reg, address):
+        # Write a 5-byte address register (TX_ADDR or RX_ADDR_P0). With the register cache on, only the
+        # least significant bytes up to the most significant one that changed are written (the chip takes
+        # address bytes LSB first and keeps the ones that aren't written).
+        address = list(address)
+        previous = self.tx_address if reg == NRF24.TX_ADDR else self.rx_p0_address if reg == NRF24.RX_ADDR_P0 else None
+        length = 5
+        if self.shadow is not None and previous is not None and len(previous) == len(address) == 5:
+            if previous == address:
+                return
+            length = len(address) - next(i for i in range(len(address)) if previous[i] != address[i])
+        self.write_register(reg, address, length)
+        if self.shadow is not None:
+            if reg == NRF24.TX_ADDR:
+                self.tx_address = address
+            elif reg == NRF24.RX_ADDR_P0:
+                self.rx_p0_address = address
 
     def openReadingPipe(self, child, address):
         # If this is pipe 0, cache the address.  This is needed because
@@ -563,6 +906,7 @@ class NRF24:
         # startListening() will have to restore it.
         if child == 0:
             self.pipe0_reading_address = address
+            self.rx_p0_address = None
 
         if child <= 6:
             # For pipes 2-5, only write the LSB
@@ -582,7 +926,7 @@ class NRF24:
 
     def closeReadingPipe(self, pipe):
         self.write_register(NRF24.EN_RXADDR,
-            self.read_register(EN_RXADDR) & ~_BV(NRF24.child_pipe_enable[pipe]))
+            self.read_register(NRF24.EN_RXADDR) & ~_BV(NRF24.child_pipe_enable[pipe]))
 
 
     def toggle_features(self):
@@ -594,7 +938,7 @@ class NRF24:
         self.write_register(NRF24.FEATURE, self.read_register(NRF24.FEATURE) | _BV(NRF24.EN_DPL))
 
         # If it didn't work, the features are not enabled
-        if not self.read_register(NRF24.FEATURE):
+        if not self.read_register_hw(NRF24.FEATURE):
             # So enable them and try again
             self.toggle_features()
             self.write_register(NRF24.FEATURE, self.read_register(NRF24.FEATURE) | _BV(NRF24.EN_DPL))
@@ -615,7 +959,7 @@ class NRF24:
                             self.read_register(NRF24.FEATURE) | _BV(NRF24.EN_ACK_PAY) | _BV(NRF24.EN_DPL))
 
         # If it didn't work, the features are not enabled
-        if not self.read_register(NRF24.FEATURE):
+        if not self.read_register_hw(NRF24.FEATURE):
             # So enable them and try again
             self.toggle_features()
             self.write_register(NRF24.FEATURE,
@@ -663,6 +1007,16 @@ class NRF24:
     def testRPD(self):
         return self.read_register(NRF24.RPD) & 1
 
+    def observeTx(self):
+        # (PLOS_CNT, ARC_CNT): packets lost since RF_CH was last written (saturates at 15), and how many times
+        # the last packet was retransmitted
+        value = self.read_register(NRF24.OBSERVE_TX)
+        return value >> NRF24.PLOS_CNT, value & 0x0F
+
+    def resetLostPackets(self):
+        # PLOS_CNT only clears when RF_CH is written
+        self.write_register(NRF24.RF_CH, self.read_register(NRF24.RF_CH))
+
     def setPALevel(self, level):
         setup = self.read_register(NRF24.RF_SETUP)
         setup &= ~( _BV(NRF24.RF_PWR_LOW) | _BV(NRF24.RF_PWR_HIGH))
@@ -720,7 +1074,7 @@ class NRF24:
         self.write_register(NRF24.RF_SETUP, setup)
 
         # Verify our result
-        if self.read_register(NRF24.RF_SETUP) == setup:
+        if self.read_register_hw(NRF24.RF_SETUP) == setup:
             result = True
         else:
             self.wide_band = False
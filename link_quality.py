@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Rolling link-quality statistics per node, from what the NRF24L01+ reports about each packet.
+#
+# Transmit side (OBSERVE_TX, read after every radio.write()):
+#   - ARC_CNT: how many times the packet had to be retransmitted before it was acked (or until MAX_RT)
+#   - PLOS_CNT: packets lost (never acked) since RF_CH was last written, i.e. the write failed
+# Receive side (RPD, read when packets come in): whether they arrived above -64 dBm
+#
+#     links = LinkQuality(window=100)
+#     links.record("kitchen", retransmits=2, lost=False) # After a write to "kitchen"
+#     links.record("kitchen", rpd=True)                  # After receiving from "kitchen"
+#     links["kitchen"].summary()  # {"packets": 1, "retry_rate": 2.0, "retried": 1.0, "loss_rate": 0.0, ...}
+#     links.summary(since=60)     # {node: summary} over the last minute (at most <window> packets)
+#
+# A retry rate creeping up or a signal presence dropping means the link is getting worse (distance, walls,
+# interference on the channel) before instructions actually stop getting through.
+
+import time
+from collections import deque
+
+
+DEFAULT_WINDOW = 200 # Packets per direction the rolling statistics are computed over
+
+
+class LinkStats:
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.tx = deque(maxlen=window) # (timestamp, retransmits, lost) of the last <window> packets sent
+        self.rx = deque(maxlen=window) # (timestamp, RPD) of the last <window> packets received
+        self.sent = 0 # Totals since the start
+        self.lost = 0
+        self.retransmits = 0
+        self.received = 0
+
+    def record_tx(self, retransmits, lost, timestamp=None):
+        self.tx.append((time.time() if timestamp is None else timestamp, retransmits, bool(lost)))
+        self.sent += 1
+        self.lost += bool(lost)
+        self.retransmits += retransmits
+
+    def record_rx(self, rpd, timestamp=None):
+        self.rx.append((time.time() if timestamp is None else timestamp, bool(rpd)))
+        self.received += 1
+
+    def summary(self, since=None, now=None):
+        # Statistics over the rolling window (only the last <since> s of it, if given). Rates are None without samples.
+        tx, rx = self.tx, self.rx
+        if since is not None:
+            start = (time.time() if now is None else now) - since
+            tx = [sample for sample in tx if sample[0] >= start]
+            rx = [sample for sample in rx if sample[0] >= start]
+        packets = len(tx)
+        return {
+            "packets": packets,
+            "retry_rate": sum(sample[1] for sample in tx) / packets if packets else None, # Mean retransmits per packet
+            "retried": sum(1 for sample in tx if sample[1]) / packets if packets else None, # Fraction that needed any
+            "loss_rate": sum(1 for sample in tx if sample[2]) / packets if packets else None,
+            "received": len(rx),
+            "signal_presence": sum(1 for sample in rx if sample[1]) / len(rx) if rx else None, # Fraction above -64 dBm
+            "last_tx": tx[-1][0] if tx else None,
+            "last_rx": rx[-1][0] if rx else None,
+            "total_sent": self.sent,
+            "total_lost": self.lost,
+            "total_received": self.received,
+        }
+
+
+class LinkQuality:
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.links = {} # Node name -> LinkStats
+
+    def __getitem__(self, node):
+        stats = self.links.get(node)
+        if stats is None:
+            stats = self.links[node] = LinkStats(self.window)
+        return stats
+
+    def __contains__(self, node):
+        return node in self.links
+
+    def nodes(self):
+        return list(self.links)
+
+    def record(self, node, retransmits=None, lost=None, rpd=None, timestamp=None):
+        # A packet sent to <node> (<retransmits>, <lost>) and/or received from it (<rpd>)
+        stats = self[node]
+        if retransmits is not None:
+            stats.record_tx(retransmits, lost, timestamp)
+        if rpd is not None:
+            stats.record_rx(rpd, timestamp)
+
+    def summary(self, since=None):
+        # {node: LinkStats.summary()}
+        return {node: stats.summary(since) for node, stats in self.links.items()}
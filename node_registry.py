@@ -0,0 +1,145 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Registry of the Arduino nodes (LED strips / temperature sensors) one radio talks to.
+#
+# The NRF24L01+ listens on up to 6 pipes at once; pipe 0 is taken by the auto-ack of our own transmissions,
+# which leaves pipes 1-5 for nodes. Each node transmits to its own reading pipe (so received packets are told
+# apart by pipe number) and is sent to by pointing the writing pipe at its address.
+#
+#     nodes = NodeRegistry()
+#     nodes.add("living room", 1)     # Arduino sketch flashed with NODE_ID 1
+#     nodes.add("kitchen", 2)         # NODE_ID 2
+#     nodes.open(radio)               # Opens the reading pipes
+#     nodes.select(radio, "kitchen")  # Writing pipe -> kitchen (only the address bytes that change are written)
+#
+# Pipes 2-5 only have their own least significant address byte, the other 4 bytes are shared with pipe 1.
+#
+# With several radios, a RadioDispatcher keeps one NodeRegistry per radio and spreads nodes across them:
+#
+#     dispatcher = RadioDispatcher(2)
+#     dispatcher.add("living room")   # -> radio 0, pipe 1
+#     dispatcher.add("kitchen")       # -> radio 1, pipe 1 (the least loaded radio)
+#     dispatcher.radio_for("kitchen") # 1
+
+from lib_nrf24 import NRF24
+
+
+NODE_PIPES = range(1, 6)
+
+
+def node_addresses(node_id):
+    # (read address, write address) of the Arduino sketch's NODE_ID <node_id>, in lib_nrf24 (MSB first) order
+    return [0xe7] * 4 + [0xe7 + node_id - 1], [0xc2] * 4 + [0xc2 + node_id - 1]
+
+
+class Node:
+    def __init__(self, name, pipe, read_address, write_address):
+        self.name = name
+        self.pipe = pipe # Reading pipe the node transmits to
+        self.read_address = list(read_address)
+        self.write_address = list(write_address)
+
+    def __repr__(self):
+        return "Node(%r, pipe=%d)" % (self.name, self.pipe)
+
+
+class NodeRegistry:
+    def __init__(self):
+        self.nodes = {} # Name -> Node, in the order they were added
+        self.pipes = {} # Pipe number -> Node
+
+    def __iter__(self):
+        return iter(self.nodes.values())
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, name):
+        return name in self.nodes
+
+    def add(self, name, pipe, read_address=None, write_address=None):
+        # Register a node on reading pipe <pipe> (1-5). Addresses default to the Arduino sketch's for NODE_ID <pipe>.
+        if pipe not in NODE_PIPES:
+            raise ValueError("Nodes can only use pipes 1-5, not %r" % (pipe,))
+        if name in self.nodes:
+            raise ValueError("There's already a node named %r" % (name,))
+        if pipe in self.pipes:
+            raise ValueError("Pipe %d is already used by %r" % (pipe, self.pipes[pipe]))
+        default_read, default_write = node_addresses(pipe)
+        node = Node(name, pipe, read_address or default_read, write_address or default_write)
+        for other in self:
+            if other.read_address[:-1] != node.read_address[:-1]:
+                raise ValueError("Pipes 1-5 share the 4 most significant address bytes: %r doesn't match %r" % (node, other))
+            if other.read_address[-1] == node.read_address[-1]:
+                raise ValueError("%r and %r have the same read address" % (node, other))
+        self.nodes[name] = node
+        self.pipes[pipe] = node
+        return node
+
+    def get(self, name=None):
+        # Node called <name> (the first node added if None)
+        if name is None:
+            return next(iter(self.nodes.values()))
+        return self.nodes[name]
+
+    def name_for(self, pipe):
+        # Name of the node on <pipe>, or the pipe number itself for packets from an unregistered pipe
+        node = self.pipes.get(pipe)
+        return node.name if node is not None else pipe
+
+    def open(self, radio):
+        # Open every node's reading pipe and point the writing pipe at the first node
+        if not self.nodes:
+            return
+        if 1 not in self.pipes:
+            # Pipe 1 holds the address bytes pipes 2-5 share, even if no node uses it
+            radio.write_register(NRF24.RX_ADDR_P1, self.get().read_address, 5)
+        for node in self:
+            radio.openReadingPipe(node.pipe, node.read_address)
+        radio.openWritingPipe(self.get().write_address)
+
+    def select(self, radio, name=None):
+        # Point the writing pipe at node <name> (openWritingPipe() skips whatever's already set). Returns the Node.
+        node = self.get(name)
+        radio.openWritingPipe(node.write_address)
+        return node
+
+
+class RadioDispatcher:
+    def __init__(self, radio_count):
+        self.registries = [NodeRegistry() for i in range(radio_count)] # One per radio
+        self.radio_of = {} # Node name -> radio index
+        self.default = None # Name of the first node added
+
+    def __iter__(self):
+        # (radio index, Node) for every node
+        for index, registry in enumerate(self.registries):
+            for node in registry:
+                yield index, node
+
+    def add(self, name, radio=None, pipe=None, read_address=None, write_address=None):
+        # Register a node on <radio> (default: the radio with the fewest nodes) and <pipe> (default: its lowest
+        # free pipe). Returns (radio index, Node).
+        if name in self.radio_of:
+            raise ValueError("There's already a node named %r" % (name,))
+        if radio is None:
+            candidates = [index for index, registry in enumerate(self.registries) if len(registry) < len(NODE_PIPES)]
+            if not candidates:
+                raise ValueError("Every radio already has %d nodes" % len(NODE_PIPES))
+            radio = min(candidates, key=lambda index: len(self.registries[index]))
+        registry = self.registries[radio]
+        if pipe is None:
+            pipe = next(p for p in NODE_PIPES if p not in registry.pipes)
+        node = registry.add(name, pipe, read_address, write_address)
+        self.radio_of[name] = radio
+        if self.default is None:
+            self.default = name
+        return radio, node
+
+    def radio_for(self, name=None):
+        # Index of the radio node <name> (default: the first node added) is on
+        return self.radio_of[self.default if name is None else name]
+
+    def nodes(self, radio):
+        return self.registries[radio]
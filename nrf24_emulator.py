@@ -0,0 +1,570 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Pure-Python emulation of the nRF24L01+ (register level) for use with lib_nrf24.NRF24.
+#
+# NRF24.__init__(gpio, spidev) takes the GPIO module and spidev object as parameters, so an
+# EmulatedGPIO + EmulatedSpiDev pair can be dropped in wherever RPi.GPIO + spidev.SpiDev() are used:
+#
+#     air = Air()
+#     gpio = EmulatedGPIO()
+#     radio = NRF24(gpio, EmulatedSpiDev(air, gpio, ce_pin=17, irq_pin=24))
+#     radio.begin(0, 17)
+#
+# Modelled: register file, STATUS bits (write-1-to-clear), 3-deep TX and RX FIFOs, auto-ack with
+# hardware retries (SETUP_RETR / OBSERVE_TX), dynamic payloads, ACK payloads, RPD and the active-low
+# IRQ line. Every attached radio shares one virtual "air" which delivers packets instantly (no time
+# on air), so timing-sensitive results (e.g. benchmarks) measure the host side only.
+
+import random
+import threading
+import time
+
+from lib_nrf24 import NRF24, _BV
+
+
+RX_DR_TX_DS_MAX_RT = _BV(NRF24.RX_DR) | _BV(NRF24.TX_DS) | _BV(NRF24.MAX_RT)
+W_TX_PAYLOAD_NOACK = 0xB0
+FIFO_DEPTH = 3
+ADDRESS_REGISTERS = (NRF24.RX_ADDR_P0, NRF24.RX_ADDR_P1, NRF24.TX_ADDR)
+
+# Register values after power on reset (nRF24L01+ product specification, section 9)
+RESET_VALUES = {
+    NRF24.CONFIG: 0x08,
+    NRF24.EN_AA: 0x3F,
+    NRF24.EN_RXADDR: 0x03,
+    NRF24.SETUP_AW: 0x03,
+    NRF24.SETUP_RETR: 0x03,
+    NRF24.RF_CH: 0x02,
+    NRF24.RF_SETUP: 0x0E,
+    NRF24.STATUS: 0x0E,
+    NRF24.RX_ADDR_P2: 0xC3,
+    NRF24.RX_ADDR_P3: 0xC4,
+    NRF24.RX_ADDR_P4: 0xC5,
+    NRF24.RX_ADDR_P5: 0xC6,
+    NRF24.FIFO_STATUS: 0x11,
+}
+RESET_ADDRESSES = {
+    NRF24.RX_ADDR_P0: [0xE7] * 5,
+    NRF24.RX_ADDR_P1: [0xC2] * 5,
+    NRF24.TX_ADDR: [0xE7] * 5,
+}
+
+
+class Air:
+    """The shared medium. Radios (EmulatedSpiDev) and virtual peers attach to it and every
+    transmission is offered to every other node on the same channel and data rate."""
+
+    def __init__(self, loss=0.0, seed=None, clock=time.monotonic):
+        self.lock = threading.RLock() # Serialises all SPI transfers and deliveries across threads
+        self.nodes = []
+        self.loss = loss # Probability that any single transmission attempt (or its ACK) is lost
+        self.link_loss = {} # (sender, receiver) -> loss probability, overrides <loss>
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.transmissions = 0 # Number of transmission attempts (including hardware retries)
+
+    def attach(self, node):
+        with self.lock:
+            if node not in self.nodes:
+                self.nodes.append(node)
+
+    def detach(self, node):
+        with self.lock:
+            if node in self.nodes:
+                self.nodes.remove(node)
+
+    def set_link_loss(self, sender, receiver, loss):
+        self.link_loss[(sender, receiver)] = loss
+
+    def _lost(self, sender, receiver):
+        loss = self.link_loss.get((sender, receiver), self.loss)
+        return loss > 0 and self.random.random() < loss
+
+    def transmit(self, sender, channel, data_rate, address, payload, want_ack):
+        # Returns (acked, ack_payload). Without <want_ack> <acked> only tells whether anyone took it.
+        with self.lock:
+            self.transmissions += 1
+            for node in self.nodes:
+                if node is sender or self._lost(sender, node):
+                    continue
+                result = node.receive(channel, data_rate, address, payload, want_ack)
+                if result is None:
+                    continue
+                acked, ack_payload = result
+                if want_ack and (not acked or self._lost(node, sender)):
+                    return False, None
+                return True, ack_payload
+            return False, None
+
+    def tick(self):
+        # Give virtual peers a chance to act (retry a pending write, send periodic telemetry, ...)
+        with self.lock:
+            now = self.clock()
+            for node in list(self.nodes):
+                poll = getattr(node, "poll", None)
+                if poll is not None:
+                    poll(now)
+
+
+class EmulatedGPIO:
+    """Stand-in for the RPi.GPIO module. CE outputs are routed to the radios that own them and
+    the radios drive their IRQ pins back as inputs, with RPi.GPIO style edge detection."""
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+    RPI_REVISION = 3
+
+    def __init__(self):
+        self.mode = None
+        self.levels = {}
+        self.output_listeners = {} # pin -> callback(level), e.g. the CE input of an emulated radio
+        self.edge_detect = {} # pin -> edge
+        self.edge_callbacks = {} # pin -> [callback(pin)]
+        self.edge_events = set()
+        self.condition = threading.Condition()
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def getmode(self):
+        return self.mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        if pin not in self.levels:
+            self.levels[pin] = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+        if direction == self.OUT and initial is not None:
+            self.output(pin, initial)
+
+    def output(self, pin, level):
+        level = self.HIGH if level else self.LOW
+        self._set_level(pin, level)
+        listener = self.output_listeners.get(pin)
+        if listener is not None:
+            listener(level)
+
+    def input(self, pin):
+        return self.levels.get(pin, self.LOW)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self.condition:
+            self.edge_detect[pin] = edge
+            self.edge_callbacks[pin] = [callback] if callback else []
+
+    def add_event_callback(self, pin, callback):
+        with self.condition:
+            self.edge_callbacks.setdefault(pin, []).append(callback)
+
+    def remove_event_detect(self, pin):
+        with self.condition:
+            self.edge_detect.pop(pin, None)
+            self.edge_callbacks.pop(pin, None)
+            self.edge_events.discard(pin)
+
+    def event_detected(self, pin):
+        with self.condition:
+            if pin in self.edge_events:
+                self.edge_events.discard(pin)
+                return True
+            return False
+
+    def wait_for_edge(self, pin, edge, bouncetime=None, timeout=None):
+        # <timeout> in ms, like RPi.GPIO. Returns the pin, or None on timeout.
+        deadline = None if timeout is None else time.monotonic() + timeout / 1000.0
+        with self.condition:
+            self.edge_detect.setdefault(pin, edge)
+            self.edge_events.discard(pin)
+            while pin not in self.edge_events:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            self.edge_events.discard(pin)
+            return pin
+
+    def cleanup(self, pin=None):
+        if pin is None:
+            self.levels.clear()
+            self.edge_detect.clear()
+            self.edge_callbacks.clear()
+            self.edge_events.clear()
+        else:
+            self.levels.pop(pin, None)
+            self.remove_event_detect(pin)
+
+    def _attach_output(self, pin, listener):
+        self.output_listeners[pin] = listener
+
+    def _drive(self, pin, level):
+        # Called by an emulated device driving one of its output lines (i.e. a GPIO input here)
+        self._set_level(pin, level)
+
+    def _set_level(self, pin, level):
+        callbacks = ()
+        with self.condition:
+            previous = self.levels.get(pin, self.LOW)
+            self.levels[pin] = level
+            edge = self.edge_detect.get(pin)
+            if edge is None or previous == level:
+                return
+            if edge == self.BOTH or (edge == self.RISING) == (level == self.HIGH):
+                self.edge_events.add(pin)
+                callbacks = list(self.edge_callbacks.get(pin, ()))
+                self.condition.notify_all()
+        for callback in callbacks:
+            callback(pin)
+
+
+class EmulatedSpiDev:
+    """Stand-in for spidev.SpiDev() talking to one emulated nRF24L01+."""
+
+    def __init__(self, air, gpio=None, ce_pin=None, irq_pin=None, p_variant=True):
+        self.air = air
+        self.gpio = gpio
+        self.ce_pin = ce_pin
+        self.irq_pin = irq_pin
+        self.p_variant = p_variant
+        self.max_speed_hz = 0
+        self.mode = 0
+        self.bus = None
+        self.device = None
+        self.xfer2_calls = 0
+        self.reset()
+
+        # CE is tied HIGH when it isn't wired to a GPIO pin (NRF24.begin(csn, ce_pin=0))
+        self.ce = gpio is None or ce_pin is None
+        if gpio is not None and ce_pin is not None:
+            gpio._attach_output(ce_pin, self._set_ce)
+        if gpio is not None and irq_pin is not None:
+            gpio.setup(irq_pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+            gpio._drive(irq_pin, gpio.HIGH)
+        air.attach(self)
+
+    def reset(self):
+        # Power on reset of the register file and FIFOs
+        self.registers = [0] * 0x20
+        for reg, value in RESET_VALUES.items():
+            self.registers[reg] = value
+        self.addresses = dict((reg, list(value)) for reg, value in RESET_ADDRESSES.items())
+        self.tx_fifo = [] # [(ack_pipe or None, payload, no_ack)]
+        self.rx_fifo = [] # [(pipe, payload)]
+        self.features_active = self.p_variant
+        self.reuse_tx = False
+
+    # spidev.SpiDev API
+
+    def open(self, bus, device):
+        self.bus = bus
+        self.device = device
+
+    def close(self):
+        self.bus = None
+        self.device = None
+
+    def xfer(self, data):
+        return self.xfer2(data)
+
+    def xfer2(self, data):
+        with self.air.lock:
+            self.xfer2_calls += 1
+            self.air.tick()
+            resp = [0] * len(data)
+            resp[0] = self._status()
+            self._execute(list(data), resp)
+            self._pump_tx()
+            self._update_irq()
+            return resp
+
+    # Command decoding
+
+    def _execute(self, data, resp):
+        cmd = data[0]
+        if cmd & 0xE0 == NRF24.R_REGISTER:
+            self._read_register(cmd & NRF24.REGISTER_MASK, resp)
+        elif cmd & 0xE0 == NRF24.W_REGISTER:
+            self._write_register(cmd & NRF24.REGISTER_MASK, data[1:])
+        elif cmd == NRF24.R_RX_PL_WID:
+            if len(resp) > 1:
+                resp[1] = len(self.rx_fifo[0][1]) if self.rx_fifo else 0
+        elif cmd == NRF24.R_RX_PAYLOAD:
+            if self.rx_fifo:
+                payload = self.rx_fifo.pop(0)[1]
+                for i in range(min(len(payload), len(resp) - 1)):
+                    resp[i + 1] = payload[i]
+        elif cmd in (NRF24.W_TX_PAYLOAD, W_TX_PAYLOAD_NOACK):
+            if len(self.tx_fifo) < FIFO_DEPTH:
+                self.tx_fifo.append((None, bytes(data[1:NRF24.MAX_PAYLOAD_SIZE + 1]), cmd == W_TX_PAYLOAD_NOACK))
+        elif cmd & 0xF8 == NRF24.W_ACK_PAYLOAD:
+            if len(self.tx_fifo) < FIFO_DEPTH and self._feature(NRF24.EN_ACK_PAY):
+                self.tx_fifo.append((cmd & 0x07, bytes(data[1:NRF24.MAX_PAYLOAD_SIZE + 1]), False))
+        elif cmd == NRF24.FLUSH_TX:
+            del self.tx_fifo[:]
+            self.reuse_tx = False
+        elif cmd == NRF24.FLUSH_RX:
+            del self.rx_fifo[:]
+        elif cmd == NRF24.REUSE_TX_PL:
+            self.reuse_tx = True
+        elif cmd == NRF24.ACTIVATE:
+            if len(data) > 1 and data[1] == 0x73 and not self.p_variant:
+                self.features_active = not self.features_active
+
+    def _read_register(self, reg, resp):
+        if reg in ADDRESS_REGISTERS:
+            value = self.addresses[reg]
+        else:
+            value = [self._register_value(reg)]
+        for i in range(1, len(resp)):
+            resp[i] = value[(i - 1) % len(value)]
+
+    def _register_value(self, reg):
+        if reg == NRF24.STATUS:
+            return self._status()
+        if reg == NRF24.FIFO_STATUS:
+            return self._fifo_status()
+        return self.registers[reg]
+
+    def _write_register(self, reg, values):
+        if not values:
+            return
+        if reg in ADDRESS_REGISTERS:
+            width = self._address_width()
+            address = self.addresses[reg]
+            for i in range(min(width, len(values))):
+                address[i] = values[i] & 0xFF
+            return
+        value = values[0] & 0xFF
+        if reg == NRF24.STATUS:
+            self.registers[NRF24.STATUS] &= ~(value & RX_DR_TX_DS_MAX_RT) & 0xFF
+        elif reg in (NRF24.OBSERVE_TX, NRF24.RPD, NRF24.FIFO_STATUS):
+            return # Read only
+        elif reg in (NRF24.FEATURE, NRF24.DYNPD) and not self.features_active:
+            return # Ignored until ACTIVATE 0x73 on the non-plus chip
+        elif reg == NRF24.RF_SETUP and not self.p_variant and value & _BV(NRF24.RF_DR_LOW):
+            return # 250KBPS doesn't exist on the non-plus chip
+        elif reg == NRF24.RF_CH:
+            self.registers[reg] = value & 0x7F
+        elif reg == NRF24.SETUP_RETR:
+            self.registers[reg] = value
+            self.registers[NRF24.OBSERVE_TX] &= 0xF0
+        elif reg == NRF24.CONFIG:
+            was_rx = self._listening()
+            self.registers[reg] = value
+            if self._listening() and not was_rx:
+                self.registers[NRF24.RPD] = 0
+        else:
+            self.registers[reg] = value
+
+    # Derived state
+
+    def _status(self):
+        status = self.registers[NRF24.STATUS] & RX_DR_TX_DS_MAX_RT
+        pipe = self.rx_fifo[0][0] if self.rx_fifo else 0b111
+        status |= pipe << NRF24.RX_P_NO
+        if len(self.tx_fifo) >= FIFO_DEPTH:
+            status |= _BV(NRF24.TX_FULL)
+        return status
+
+    def _fifo_status(self):
+        fifo_status = 0
+        if self.reuse_tx:
+            fifo_status |= _BV(NRF24.TX_REUSE)
+        if len(self.tx_fifo) >= FIFO_DEPTH:
+            fifo_status |= _BV(NRF24.FIFO_FULL)
+        if not self.tx_fifo:
+            fifo_status |= _BV(NRF24.TX_EMPTY)
+        if len(self.rx_fifo) >= FIFO_DEPTH:
+            fifo_status |= _BV(NRF24.RX_FULL)
+        if not self.rx_fifo:
+            fifo_status |= _BV(NRF24.RX_EMPTY)
+        return fifo_status
+
+    def _address_width(self):
+        return max(3, min(5, (self.registers[NRF24.SETUP_AW] & 0x03) + 2))
+
+    def _powered(self):
+        return bool(self.registers[NRF24.CONFIG] & _BV(NRF24.PWR_UP))
+
+    def _listening(self):
+        config = self.registers[NRF24.CONFIG]
+        return bool(config & _BV(NRF24.PWR_UP)) and bool(config & _BV(NRF24.PRIM_RX))
+
+    def _feature(self, bit):
+        return bool(self.registers[NRF24.FEATURE] & _BV(bit))
+
+    def _data_rate(self):
+        return self.registers[NRF24.RF_SETUP] & (_BV(NRF24.RF_DR_LOW) | _BV(NRF24.RF_DR_HIGH))
+
+    def _dynamic_pipe(self, pipe):
+        return self._feature(NRF24.EN_DPL) and bool(self.registers[NRF24.DYNPD] & _BV(pipe))
+
+    def _pipe_address(self, pipe):
+        width = self._address_width()
+        if pipe == 0:
+            return self.addresses[NRF24.RX_ADDR_P0][:width]
+        address = list(self.addresses[NRF24.RX_ADDR_P1][:width])
+        if pipe > 1:
+            address[0] = self.registers[NRF24.RX_ADDR_P0 + pipe]
+        return address
+
+    def _update_irq(self):
+        if self.gpio is None or self.irq_pin is None:
+            return
+        # Active low whenever an unmasked interrupt flag is set (CONFIG MASK_* bits line up with STATUS)
+        pending = self.registers[NRF24.STATUS] & ~self.registers[NRF24.CONFIG] & RX_DR_TX_DS_MAX_RT
+        self.gpio._drive(self.irq_pin, self.gpio.LOW if pending else self.gpio.HIGH)
+
+    # CE and the air
+
+    def _set_ce(self, level):
+        with self.air.lock:
+            rising = level and not self.ce
+            self.ce = bool(level)
+            if rising and self._listening():
+                self.registers[NRF24.RPD] = 0
+            self._pump_tx()
+            self.air.tick() # A radio may have just started listening
+            self._update_irq()
+
+    def _pump_tx(self):
+        # PTX with CE high sends until the TX FIFO is empty (or MAX_RT has to be cleared first)
+        while self.ce and self._powered() and not self._listening():
+            if self.registers[NRF24.STATUS] & _BV(NRF24.MAX_RT):
+                return
+            entry = next((e for e in self.tx_fifo if e[0] is None), None)
+            if entry is None:
+                return
+            self._transmit(entry)
+
+    def _transmit(self, entry):
+        _, payload, no_ack = entry
+        want_ack = not no_ack and bool(self.registers[NRF24.EN_AA] & _BV(NRF24.ENAA_P0))
+        retries = self.registers[NRF24.SETUP_RETR] & 0x0F if want_ack else 0
+        channel = self.registers[NRF24.RF_CH]
+        address = self.addresses[NRF24.TX_ADDR][:self._address_width()]
+        # The ACK comes back on pipe 0, so RX_ADDR_P0 has to match TX_ADDR
+        can_hear_ack = (self._pipe_address(0) == address and
+                        bool(self.registers[NRF24.EN_RXADDR] & _BV(NRF24.ERX_P0)))
+        for attempt in range(retries + 1):
+            acked, ack_payload = self.air.transmit(self, channel, self._data_rate(), address, payload, want_ack)
+            if not want_ack or (acked and can_hear_ack):
+                break
+        else:
+            lost = min(15, (self.registers[NRF24.OBSERVE_TX] >> NRF24.PLOS_CNT) + 1)
+            self.registers[NRF24.OBSERVE_TX] = (lost << NRF24.PLOS_CNT) | retries
+            self.registers[NRF24.STATUS] |= _BV(NRF24.MAX_RT)
+            return
+        if not self.reuse_tx:
+            self.tx_fifo.remove(entry)
+        observe = self.registers[NRF24.OBSERVE_TX]
+        self.registers[NRF24.OBSERVE_TX] = (observe & 0xF0) | attempt
+        self.registers[NRF24.STATUS] |= _BV(NRF24.TX_DS)
+        if want_ack and ack_payload is not None and len(self.rx_fifo) < FIFO_DEPTH:
+            self.rx_fifo.append((0, bytes(ack_payload)))
+            self.registers[NRF24.STATUS] |= _BV(NRF24.RX_DR)
+
+    def receive(self, channel, data_rate, address, payload, want_ack):
+        # Air callback. Returns None if the packet wasn't for us, else (acked, ack_payload).
+        if not (self.ce and self._listening()):
+            return None
+        if channel != self.registers[NRF24.RF_CH] or data_rate != self._data_rate():
+            return None
+        self.registers[NRF24.RPD] = 1 # Received power detected on the channel
+        enabled = self.registers[NRF24.EN_RXADDR]
+        for pipe in range(6):
+            if enabled & _BV(pipe) and self._pipe_address(pipe) == list(address):
+                break
+        else:
+            return None
+        if not self._dynamic_pipe(pipe) and len(payload) != self.registers[NRF24.RX_PW_P0 + pipe]:
+            return None
+        if len(self.rx_fifo) >= FIFO_DEPTH:
+            return False, None # No room, so no ACK either; the sender will retry
+        self.rx_fifo.append((pipe, bytes(payload)))
+        self.registers[NRF24.STATUS] |= _BV(NRF24.RX_DR)
+        self._update_irq()
+        if not (want_ack and self.registers[NRF24.EN_AA] & _BV(pipe)):
+            return False, None
+        ack_payload = None
+        for entry in self.tx_fifo:
+            if entry[0] == pipe:
+                self.tx_fifo.remove(entry)
+                ack_payload = entry[1]
+                self.registers[NRF24.STATUS] |= _BV(NRF24.TX_DS)
+                self._update_irq()
+                break
+        return True, ack_payload
+
+
+class ArduinoPeer:
+    """Virtual node that speaks arduino_rpi_transcieve_rgb_temp.ino's protocol without an SPI model:
+    it listens on <read_addr>, echoes every non-zero 4-byte instruction back to <write_addr> for up to
+    <ack_timeout> seconds (unless <echo_ack> is False) and sends the 2-byte raw temperature reading every <temp_period> seconds
+    (or, with <temp_in_ack>, returns it in every ACK payload)."""
+
+    def __init__(self, air, read_addr=None, write_addr=None, channel=125, data_rate=0,
+                 ack_timeout=0.025, temp_period=3.0, temperature=None, echo_ack=True, temp_in_ack=False):
+        self.air = air
+        # Addresses use the same list order as NRF24.openReadingPipe/openWritingPipe (sent reversed)
+        self.read_addr = list(reversed(read_addr or [0xc2] * 5))
+        self.write_addr = list(reversed(write_addr or [0xe7] * 5))
+        self.channel = channel
+        self.data_rate = data_rate # RF_SETUP data rate bits, 0 is 1MBPS
+        self.ack_timeout = ack_timeout
+        self.temp_period = temp_period
+        self.temperature = temperature or (lambda: 400) # Raw analogRead() value [0, 1023]
+        self.echo_ack = echo_ack # The sketch's ECHO_ACK: False when the RPi relies on the hardware auto-ack
+        self.temp_in_ack = temp_in_ack # The sketch's TEMP_IN_ACK: the reading goes in every ACK payload instead of its own packet
+        self.instruction = [0, 255, 255, 255]
+        self.instructions = [] # Every instruction received, in order
+        self.pending = None # (payload, deadline) of the echo being retried
+        self.last_temp_send = air.clock()
+        self.sent = 0
+        air.attach(self)
+
+    def receive(self, channel, data_rate, address, payload, want_ack):
+        if channel != self.channel or data_rate != self.data_rate or list(address) != self.read_addr:
+            return None
+        payload = list(payload)
+        if len(payload) == 4 and sum(payload) != 0:
+            self.instruction = payload
+            self.instructions.append(payload)
+            if self.echo_ack:
+                self.pending = (bytes(payload), self.air.clock() + self.ack_timeout)
+        if self.temp_in_ack:
+            return True, self._temperature_bytes()
+        return True, None
+
+    def poll(self, now):
+        if self.pending is not None:
+            payload, deadline = self.pending
+            if now > deadline:
+                self.pending = None
+            elif self._send(payload):
+                # The sketch keeps re-sending for the whole ACK_TIMEOUT; one confirmed copy is enough here
+                self.pending = None
+        if self.temp_period and not self.temp_in_ack and now - self.last_temp_send >= self.temp_period:
+            self.last_temp_send = now
+            self._send(self._temperature_bytes())
+
+    def _temperature_bytes(self):
+        raw = self.temperature() & 0xFFFF
+        return bytes([raw & 0xFF, raw >> 8])
+
+    def _send(self, payload):
+        acked, _ = self.air.transmit(self, self.channel, self.data_rate, self.write_addr, payload, True)
+        if acked:
+            self.sent += 1
+        return acked
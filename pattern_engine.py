@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Declarative LED patterns, compiled ahead of time into 4-byte instruction frames.
+#
+# A Pattern is data: keyframe colors (RGB or HSV), how long each one lasts, and how to ease from one
+# keyframe to the next. compile_pattern() renders it once, at <fps>, into packed frames in the Arduino's
+# instruction encoding (mode 1 RGB, or the HSV encoding used by set_LED_HSV()), merges runs of identical
+# frames, and caches the result, so playing it costs no per-frame color math:
+#
+#     fade = Pattern([((255, 0, 0), 1.0), ((0, 0, 255), 1.0)], easing="ease_in_out", fps=30)
+#     sequence = play_pattern(scheduler, fade) # PatternScheduler: frames that can't be sent in time are dropped
+#
+# Frames are streamed through send_instruction(), which already drops frames the radio link hasn't gotten to
+# yet in favour of the newest one.
+
+
+def _linear(t):
+    return t
+
+def _step(t):
+    return 0.0
+
+def _ease_in(t):
+    return t * t
+
+def _ease_out(t):
+    return t * (2.0 - t)
+
+def _ease_in_out(t):
+    return t * t * (3.0 - 2.0 * t)
+
+EASINGS = {
+    "linear": _linear,
+    "step": _step, # Hold each keyframe color for its whole duration
+    "ease_in": _ease_in,
+    "ease_out": _ease_out,
+    "ease_in_out": _ease_in_out,
+}
+
+
+def encode_rgb(r, g, b):
+    return bytes([1, r, g, b])
+
+def encode_hsv(h, s, v):
+    if h < 104: # h: [0, 103] => b0: [151, 254], b1: DON'T_CARE
+        return bytes([h + 151, 0, s, v])
+    return bytes([255, h - 104, s, v]) # h: [104, 359] => b0: 255, b1: [0, 255]
+
+
+class Pattern:
+    """
+    keyframes: [(color, duration in s)] or [(color, duration, easing)], color being (r, g, b) with r, g, b in
+    [0, 255] for space="rgb", or (h, s, v) with h in [0, 359] and s, v in [0, 100] for space="hsv".
+    Each keyframe eases into the next one over its duration (the last one into the first, if <repeat>).
+    """
+
+    def __init__(self, keyframes, space="rgb", easing="linear", fps=20, repeat=True):
+        if space not in ("rgb", "hsv"):
+            raise ValueError("space must be 'rgb' or 'hsv', not %r" % (space,))
+        self.keyframes = tuple((tuple(keyframe[0]), float(keyframe[1]), keyframe[2] if len(keyframe) > 2 else easing)
+                               for keyframe in keyframes)
+        for color, duration, keyframe_easing in self.keyframes:
+            if keyframe_easing not in EASINGS:
+                raise ValueError("Unknown easing %r (choose from %s)" % (keyframe_easing, ", ".join(EASINGS)))
+        self.space = space
+        self.fps = fps
+        self.repeat = repeat
+
+    def key(self):
+        return (self.keyframes, self.space, self.fps, self.repeat)
+
+    def __eq__(self, other):
+        return isinstance(other, Pattern) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+
+class CompiledPattern:
+    def __init__(self, frames, steps, frame_count, repeat):
+        self.frames = frames # Every rendered frame, packed (4 bytes each)
+        self.steps = steps # [(instruction, duration)] for PatternScheduler.play(), identical consecutive frames merged
+        self.frame_count = frame_count
+        self.duration = sum(duration for instruction, duration in steps)
+        self.repeat = repeat
+
+
+_compiled = {} # Pattern -> CompiledPattern
+
+def compile_pattern(pattern):
+    compiled = _compiled.get(pattern)
+    if compiled is None:
+        compiled = _compiled[pattern] = _compile(pattern)
+    return compiled
+
+def _compile(pattern):
+    encode = encode_rgb if pattern.space == "rgb" else encode_hsv
+    frames = bytearray()
+    runs = [] # [[frame, number of identical consecutive frames]]
+    keyframes = pattern.keyframes
+    for i, (color, duration, easing) in enumerate(keyframes):
+        if i + 1 < len(keyframes):
+            target = keyframes[i + 1][0]
+        else:
+            target = keyframes[0][0] if pattern.repeat else color
+        ease = EASINGS[easing]
+        count = max(1, int(round(duration * pattern.fps)))
+        for n in range(count):
+            frame = encode(*_interpolate(color, target, ease(n / count), pattern.space))
+            frames += frame
+            if runs and runs[-1][0] == frame:
+                runs[-1][1] += 1
+            else:
+                runs.append([frame, 1])
+    steps = [(frame, count / pattern.fps) for frame, count in runs]
+    return CompiledPattern(bytes(frames), steps, len(frames) // 4, pattern.repeat)
+
+def _interpolate(start, end, t, space):
+    if space == "hsv":
+        dh = (end[0] - start[0] + 180) % 360 - 180 # Shortest way around the hue circle
+        h = int(round(start[0] + dh * t)) % 360
+        return (h,) + tuple(int(round(a + (b - a) * t)) for a, b in zip(start[1:], end[1:]))
+    return tuple(int(round(a + (b - a) * t)) for a, b in zip(start, end))
+
+
+def play_pattern(scheduler, pattern):
+    # Start streaming <pattern> on a PatternScheduler. Returns the Sequence (cancel() to stop).
+    compiled = compile_pattern(pattern)
+    return scheduler.play(compiled.steps, repeat=compiled.repeat)
+
+
+CHRISTMAS_COLORS = Pattern([((255, 0, 0), 0.5), ((0, 255, 0), 0.5), ((255, 255, 255), 0.5)], easing="step")
+RAINBOW = Pattern([((0, 100, 100), 2.0), ((120, 100, 100), 2.0), ((240, 100, 100), 2.0)], space="hsv", fps=30)
+BREATHE_WHITE = Pattern([((0, 0, 0), 1.5, "ease_in_out"), ((255, 255, 255), 1.5, "ease_in_out")])
@@ -0,0 +1,141 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Timer-heap scheduler for LED patterns (timed sequences of instructions).
+#
+# One thread sleeps on a Condition until the next step is due (no busy-waiting), then hands the step's
+# instruction to <send> (e.g. the RPi script's send_instruction()). Step times are computed from the
+# sequence's start on a monotonic clock, not from when the previous step actually ran, so timing doesn't
+# drift; if the scheduler falls more than a step behind, the missed steps are skipped rather than sent late.
+#
+#     scheduler = PatternScheduler(send_instruction)
+#     pattern = scheduler.play([((1, 255, 0, 0), 0.5), ((1, 0, 255, 0), 0.5)]) # (instruction, hold time in s)
+#     pattern.cancel() # Takes effect immediately: once it returns, no further step of <pattern> is sent
+#
+# Any number of sequences can play at once.
+
+import time
+import heapq
+import itertools
+import threading
+
+
+class Sequence:
+    """Handle for a sequence playing on a PatternScheduler."""
+
+    def __init__(self, scheduler, steps, repeat):
+        self.scheduler = scheduler
+        self.steps = list(steps) # [(instruction, duration)]
+        self.repeat = repeat # Loop forever (True) or play the steps once (False)
+        self.index = 0 # Next step
+        self.sent = 0 # Steps sent
+        self.skipped = 0 # Steps skipped because the scheduler was running late
+        self.cancelled = False
+        self.finished = threading.Event()
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def is_alive(self):
+        return not self.finished.is_set()
+
+    def wait(self, timeout=None):
+        # Wait until the sequence ends (played once through or cancelled). Returns False on timeout.
+        return self.finished.wait(timeout)
+
+
+class PatternScheduler:
+    def __init__(self, send, clock=time.monotonic):
+        self.send = send # Called as send(*instruction) for every step, from the scheduler thread
+        self.clock = clock
+        self.heap = [] # [(due time, tie-breaker, Sequence)]
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.send_lock = threading.Lock() # Held while a step is being sent, so cancel() returns only once it's done
+        self.thread = None
+        self.stopped = False
+
+    def play(self, steps, repeat=True, start=None):
+        # Start playing [(instruction, duration in s)] at <start> (clock time, default: now). Returns its Sequence.
+        sequence = Sequence(self, steps, repeat)
+        if not sequence.steps:
+            sequence.finished.set()
+            return sequence
+        with self.condition:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopped = False
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            heapq.heappush(self.heap, (self.clock() if start is None else start, next(self.counter), sequence))
+            self.condition.notify()
+        return sequence
+
+    def cancel(self, sequence):
+        with self.condition:
+            sequence.cancelled = True
+            self.heap = [entry for entry in self.heap if entry[2] is not sequence]
+            heapq.heapify(self.heap)
+            self.condition.notify()
+        with self.send_lock:
+            sequence.finished.set()
+
+    def cancel_all(self):
+        with self.condition:
+            sequences = [entry[2] for entry in self.heap]
+        for sequence in sequences:
+            self.cancel(sequence)
+
+    def active(self):
+        with self.condition:
+            return [entry[2] for entry in self.heap]
+
+    def stop(self):
+        # Cancel everything and end the scheduler thread
+        self.cancel_all()
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped:
+                    if self.heap:
+                        delay = self.heap[0][0] - self.clock()
+                        if delay <= 0:
+                            break
+                        self.condition.wait(delay)
+                    else:
+                        self.condition.wait()
+                if self.stopped:
+                    return
+                due, _, sequence = heapq.heappop(self.heap)
+                instruction, duration = sequence.steps[sequence.index]
+                sequence.index += 1
+                # Next step is due relative to this step's scheduled time; skip steps that are already over
+                next_due = due + duration
+                now = self.clock()
+                while not self._at_end(sequence):
+                    next_duration = sequence.steps[sequence.index][1]
+                    if next_due + next_duration > now or next_duration <= 0:
+                        break
+                    next_due += next_duration
+                    sequence.index += 1
+                    sequence.skipped += 1
+                if self._at_end(sequence):
+                    sequence.index = 0
+                if sequence.repeat or sequence.index:
+                    heapq.heappush(self.heap, (next_due, next(self.counter), sequence))
+            with self.send_lock:
+                if sequence.cancelled:
+                    continue
+                self.send(*instruction)
+                sequence.sent += 1
+            if not (sequence.repeat or sequence.index):
+                sequence.finished.set()
+
+    @staticmethod
+    def _at_end(sequence):
+        return sequence.index >= len(sequence.steps)
@@ -0,0 +1,291 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Long-lived owner of the radio(s), shared by any number of local clients through a Unix domain socket.
+#
+#     python3 radio_daemon.py [--socket /tmp/rgb_temp_radio.sock]
+#
+# Uses the configuration (radios, nodes, ACK mode, ...) of rpi_arduino_transcieve_rgb_temp.py. Clients send
+# newline-delimited requests and may pipeline as many as they like on one connection; every request gets one
+# response line, in order. A request is either a JSON object:
+#
+#     {"id": 1, "instruction": [1, 255, 0, 0], "node": "arduino"}  -> {"id": 1, "ok": true, "queued": 1}
+#     {"id": 2, "command": "hsv 270 50 100; cycle 20 80"}          -> {"id": 2, "ok": true, "queued": 2}
+#     {"id": 3, "subscribe": ["temperature", "outcome"]}          -> {"id": 3, "ok": true, "subscribed": [...]}
+#     {"id": 4, "query": "latest"}                                 -> {"id": 4, "ok": true, "latest": {node: {...}}}
+#     {"id": 5, "query": "stats"}                                  -> {"id": 5, "ok": true, "coalesced": 1234, "given_up": 2}
+#     {"id": 6, "query": "link", "since": 60}                      -> {"id": 6, "ok": true, "link": {node: {"retry_rate": ...}}}
+#     {"id": 7, "query": "temperatures", "node": "arduino", "last": 10}             -> {..., "samples": [[time, raw, degC], ...]}
+#     {"id": 8, "query": "temperatures", "t0": 1571230000, "t1": 1571233600}         -> samples in [t0, t1) for every node
+#     {"id": 9, "query": "temperatures", "resolution": 3600, "t0": 1571000000}       -> {..., "buckets": [[start, min, mean, max °C, count], ...]}
+#     {"id": 10, "query": "temperatures", "summary": true, "t0": 1571000000}         -> {..., "summary": [min, mean, max °C, count]}
+#
+# or a plain text command line (e.g. `echo "rgb 255 0 0" | nc -U /tmp/rgb_temp_radio.sock`). Subscribed events
+# are pushed as they happen, interleaved with the responses:
+#
+#     {"event": "temperature", "node": "arduino", "time": 1571234567.8, "raw": 400, "celsius": 25.8}
+#     {"event": "result", "node": "arduino", "instruction": [1, 255, 0, 0], "confirmed": true, "coalesced": 3}
+#     {"event": "outcome", "node": "arduino", "instruction": [1, 255, 0, 0], "confirmed": false, "attempts": 42, "elapsed": 30.01}
+#     {"event": "link", "node": "arduino", "time": 1571234567.8, "retransmits": 2, "lost": false, "rpd": null}
+#
+# Instructions are queued to the radio worker processes without waiting for the radio: everything read from a
+# connection in one go is queued together, and each worker only sends the newest instruction per node. "coalesced"
+# counts the older instructions for the node that were dropped in favour of the one in the result (in total for "stats").
+# A result is one attempt; an outcome is the end of an instruction (confirmed, or given up on by the retry policy).
+# Link events are per packet (see link_quality.py); the "link" query summarises them per node over a rolling window.
+# A subscriber that leaves more than MAX_SUBSCRIBER_BACKLOG bytes of events unread is disconnected, and so is a client
+# sending a request line longer than MAX_REQUEST_LINE.
+# Temperature readings are kept by the daemon (see temperature_series.py) from the moment it starts; "temperatures"
+# answers per node (all nodes unless "node" is given): samples as raw values and °C, aggregates in °C. Times are time.time() seconds.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from multiprocessing import Queue
+
+from temperature_conversion import decode_raw, calibration_for
+from temperature_series import TemperatureStore
+from link_quality import LinkQuality
+
+
+DEFAULT_SOCKET = "/tmp/rgb_temp_radio.sock"
+EVENTS = ("temperature", "result", "outcome", "link")
+MAX_SUBSCRIBER_BACKLOG = 1 << 20 # Bytes of events a subscriber may leave unread before it's disconnected
+MAX_REQUEST_LINE = 1 << 16 # Longest request line (bytes) accepted
+
+
+class RadioDaemon:
+    def __init__(self, transceiver, parse_commands=None, path=DEFAULT_SOCKET, mode=0o660):
+        self.transceiver = transceiver
+        self.parse_commands = parse_commands # Text command line -> [(command, instruction)] (None: JSON instructions only)
+        self.path = path
+        self.mode = mode # Socket file permissions
+        self.events = Queue() # Events from the radio worker processes
+        self.temperatures = TemperatureStore() # Readings seen by the daemon, for "latest" and "temperatures" queries
+        self.links = LinkQuality() # Link statistics reported by the radio workers, for "link" queries
+        self.subscribers = {} # Event name -> set of StreamWriters
+        self.loop = None
+        self.server = None
+        transceiver.on_temperature = self._worker_temperature
+        transceiver.on_result = self._worker_result
+        transceiver.on_outcome = self._worker_outcome
+        transceiver.on_link = self._worker_link
+        transceiver.suppress_output.value = False
+
+    # Radio worker processes
+
+    def _worker_temperature(self, sensor, payload):
+        self.events.put(("temperature", sensor, time.time(), bytes(payload)))
+
+    def _worker_result(self, node, instruction, confirmed, coalesced):
+        self.events.put(("result", node, list(instruction), confirmed, coalesced))
+
+    def _worker_outcome(self, node, instruction, confirmed, attempts, elapsed):
+        self.events.put(("outcome", node, list(instruction), confirmed, attempts, elapsed))
+
+    def _worker_link(self, node, retransmits, lost, rpd):
+        self.events.put(("link", node, time.time(), retransmits, lost, rpd))
+
+    def _event_reader(self):
+        # Thread: worker events -> event loop
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            self.loop.call_soon_threadsafe(self._publish, event)
+
+    def _publish(self, event):
+        if event[0] == "temperature":
+            name, sensor, timestamp, payload = event
+            raw = decode_raw(payload)
+            if raw is None:
+                return
+            self.temperatures.record(sensor, raw, timestamp)
+            message = {"event": name, "node": sensor, "time": timestamp, "raw": raw, "celsius": celsius(sensor, raw)}
+        elif event[0] == "result":
+            name, node, instruction, confirmed, coalesced = event
+            message = {"event": name, "node": node, "instruction": instruction, "confirmed": confirmed, "coalesced": coalesced}
+        elif event[0] == "link":
+            name, node, timestamp, retransmits, lost, rpd = event
+            self.links.record(node, retransmits, lost, rpd, timestamp)
+            message = {"event": name, "node": node, "time": timestamp, "retransmits": retransmits, "lost": lost, "rpd": rpd}
+        else:
+            name, node, instruction, confirmed, attempts, elapsed = event
+            message = {"event": name, "node": node, "instruction": instruction, "confirmed": confirmed, "attempts": attempts,
+                       "elapsed": round(elapsed, 3)}
+        line = (json.dumps(message) + "\n").encode()
+        for writer in list(self.subscribers.get(name, ())):
+            if writer.is_closing():
+                self.subscribers[name].discard(writer)
+            elif writer.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BACKLOG:
+                self._unsubscribe(writer)
+                writer.close() # Stopped reading: don't buffer events for it forever
+            else:
+                writer.write(line)
+
+    def _unsubscribe(self, writer):
+        for writers in self.subscribers.values():
+            writers.discard(writer)
+
+    # Clients
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        threading.Thread(target=self._event_reader, daemon=True).start()
+        self.transceiver.start()
+        if os.path.exists(self.path):
+            os.unlink(self.path) # Left over from a previous run
+        self.server = await asyncio.start_unix_server(self._client, path=self.path)
+        os.chmod(self.path, self.mode)
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        self.events.put(None)
+        self.transceiver.stop()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _client(self, reader, writer):
+        pending = b""
+        try:
+            while True:
+                data = await reader.read(65536) # Everything the client has pipelined so far
+                if not data:
+                    break
+                lines = (pending + data).split(b"\n")
+                pending = lines.pop()
+                writer.write(b"".join((json.dumps(self.handle(line, writer)) + "\n").encode() for line in lines if line.strip()))
+                if len(pending) > MAX_REQUEST_LINE:
+                    writer.write((json.dumps({"ok": False, "error": "Request line longer than %d bytes" % MAX_REQUEST_LINE}) + "\n").encode())
+                    break
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._unsubscribe(writer)
+            writer.close()
+
+    def handle(self, line, writer=None):
+        # Response (dict) to one request line
+        request = {}
+        try:
+            text = line.decode().strip()
+            if text.startswith("{"):
+                request = json.loads(text)
+                if not isinstance(request, dict):
+                    raise ValueError("Requests must be JSON objects")
+            else:
+                request = {"command": text}
+            response = self._handle(request, writer)
+        except (ValueError, KeyError, TypeError) as e:
+            response = {"ok": False, "error": str(e) if not isinstance(e, KeyError) else "Unknown node %s" % e}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def _handle(self, request, writer):
+        node = request.get("node")
+        if node is not None and node not in self.transceiver.dispatcher.radio_of:
+            raise KeyError(node)
+        if "instruction" in request:
+            instruction = [int(b) for b in request["instruction"]]
+            if len(instruction) != 4 or any(b not in range(256) for b in instruction):
+                raise ValueError("An instruction is 4 bytes in [0, 255]")
+            self.transceiver.send_instruction(*instruction, node=node)
+            return {"ok": True, "queued": 1}
+        if "command" in request:
+            if self.parse_commands is None:
+                raise ValueError("Text commands aren't available, send {\"instruction\": [b0, b1, b2, b3]}")
+            commands = self.parse_commands(request["command"])
+            for command, instruction in commands:
+                self.transceiver.send_instruction(*instruction, node=node)
+            return {"ok": True, "queued": len(commands)}
+        if "subscribe" in request:
+            events = request["subscribe"]
+            events = [events] if isinstance(events, str) else list(events)
+            for event in events:
+                if event not in EVENTS:
+                    raise ValueError("Unknown event %r (events: %s)" % (event, ", ".join(EVENTS)))
+            for event in events:
+                self.subscribers.setdefault(event, set()).add(writer)
+            return {"ok": True, "subscribed": events}
+        if request.get("query") == "latest":
+            latest = {}
+            for sensor in self.temperatures.sensors():
+                timestamp, raw = self.temperatures[sensor].latest()
+                latest[sensor] = {"time": timestamp, "raw": raw, "celsius": celsius(sensor, raw)}
+            return {"ok": True, "latest": latest}
+        if request.get("query") == "stats":
+            return {"ok": True, "coalesced": self.transceiver.coalesced.value, "given_up": self.transceiver.given_up.value}
+        if request.get("query") == "link":
+            since = request.get("since")
+            return {"ok": True, "link": self.links.summary(float(since) if since is not None else None)}
+        if request.get("query") == "temperatures":
+            return dict({"ok": True}, **self._temperatures(request, node))
+        raise ValueError("Unknown request (expected instruction, command, subscribe or query: latest/temperatures/stats/link)")
+
+    def _temperatures(self, request, node):
+        # Last-N samples, samples in [t0, t1), min/mean/max buckets at one resolution, or a summary of [t0, t1)
+        sensors = [node] if node is not None else self.temperatures.sensors()
+        t0 = float(request.get("t0", 0.0))
+        t1 = float(request.get("t1", float("inf")))
+        if request.get("summary"):
+            summaries = {}
+            for sensor in sensors:
+                summary = self.temperatures[sensor].summary(t0, t1) if sensor in self.temperatures else None
+                if summary is not None:
+                    low, mean, high, count = summary
+                    summary = [celsius(sensor, low), celsius(sensor, mean), celsius(sensor, high), count]
+                summaries[sensor] = summary
+            return {"summary": summaries}
+        if "resolution" in request:
+            resolution = int(request["resolution"])
+            buckets = {}
+            for sensor in sensors:
+                rows = self.temperatures[sensor].aggregate(resolution, t0, t1) if sensor in self.temperatures else []
+                buckets[sensor] = [[start, celsius(sensor, low), celsius(sensor, mean), celsius(sensor, high), count]
+                                   for start, low, mean, high, count in rows]
+            return {"buckets": buckets}
+        samples = {}
+        for sensor in sensors:
+            if sensor not in self.temperatures:
+                rows = []
+            elif "last" in request:
+                rows = self.temperatures[sensor].last(int(request["last"]))
+            else:
+                rows = self.temperatures[sensor].between(t0, t1)
+            samples[sensor] = [[timestamp, raw, celsius(sensor, raw)] for timestamp, raw in rows]
+        return {"samples": samples}
+
+
+def celsius(sensor, raw):
+    # °C for a raw value (or a mean of raw values), rounded for display
+    calibration = calibration_for(sensor)
+    return round(raw * calibration.slope + calibration.intercept, 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Share the NRF24L01+ radio(s) through a Unix domain socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="socket path (default: %(default)s)")
+    parser.add_argument("--mode", type=lambda mode: int(mode, 8), default=0o660, help="socket permissions, octal (default: 660)")
+    args = parser.parse_args(argv)
+
+    import rpi_arduino_transcieve_rgb_temp as script # Its radio/node configuration (importing it doesn't touch the hardware)
+    daemon = RadioDaemon(script.transceiver, script.parse_commands, args.socket, args.mode)
+    try:
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# How hard the radio workers try to get an instruction through before giving up on it.
+#
+# Two layers of retries:
+#   - hardware: the NRF24L01+ itself retransmits an unacknowledged packet up to <hardware_count> (ARC) times,
+#     <hardware_delay> (ARD) apart, within one radio.write() (SETUP_RETR, set with radio.setRetries())
+#   - software: an instruction that still isn't confirmed is tried again after an exponentially growing,
+#     jittered delay, until it's been tried <max_attempts> times or <deadline> s have passed since the first try
+#
+#     policy = RetryPolicy(hardware_delay=4, hardware_count=15, base_delay=0.01, max_delay=1.0, deadline=30)
+#     transceiver = Transceiver(retry_policy=policy, on_outcome=lambda node, instruction, confirmed, attempts, elapsed: ...)
+#
+# While a node backs off, the worker keeps serving the other nodes and listening for temperatures, so one dead
+# node can't keep the channel busy.
+
+import random
+
+
+class RetryPolicy:
+    def __init__(self, hardware_delay=4, hardware_count=15, base_delay=0.01, max_delay=1.0, multiplier=2.0, jitter=0.5,
+                 max_attempts=None, deadline=30.0):
+        if hardware_delay not in range(16) or hardware_count not in range(16):
+            raise ValueError("hardware_delay (ARD) and hardware_count (ARC) are 4-bit values in [0, 15]")
+        if not 0 <= jitter <= 1:
+            raise ValueError("jitter must be in [0, 1], not %r" % (jitter,))
+        self.hardware_delay = hardware_delay # ARD: hardware retransmits are (hardware_delay + 1) * 250 µs apart
+        self.hardware_count = hardware_count # ARC: hardware retransmits per radio.write() (0: none)
+        self.base_delay = base_delay # Software backoff (in s) after the first failed attempt
+        self.max_delay = max_delay # Cap on the software backoff (in s)
+        self.multiplier = multiplier # Backoff growth per failed attempt
+        self.jitter = jitter # Fraction of each backoff that's randomised (spreads out nodes retrying in lockstep)
+        self.max_attempts = max_attempts # Give up after this many attempts (None: no limit)
+        self.deadline = deadline # Give up this many s after the first attempt (None: never)
+
+    def apply(self, radio):
+        # Program the hardware retries into <radio>'s SETUP_RETR
+        radio.setRetries(self.hardware_delay, self.hardware_count)
+
+    def backoff(self, attempts):
+        # Delay (in s) before the next attempt, after <attempts> failed ones
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempts - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def gives_up(self, attempts, elapsed):
+        # True if an instruction tried <attempts> times over <elapsed> s shouldn't be tried again
+        if self.max_attempts is not None and attempts >= self.max_attempts:
+            return True
+        return self.deadline is not None and elapsed >= self.deadline
+
+
+DEFAULT_POLICY = RetryPolicy()
@@ -1,48 +1,57 @@
 import os
 import sys
-import time
-import spidev
+import argparse
 import textwrap
 import datetime
-import threading
-import RPi.GPIO as GPIO
-from ctypes import c_bool
-from lib_nrf24 import NRF24 # https://github.com/BLavery/lib_nrf24
 from contextlib import contextmanager
 from colorama import Fore, Back, Style
-from multiprocessing import Process, Value
+from transceiver import Transceiver # Radio side (lib_nrf24: https://github.com/BLavery/lib_nrf24), set up on first use
+from node_registry import RadioDispatcher
+from retry_policy import RetryPolicy
+from temperature_conversion import decode_raw, calibration_for
+from pattern_scheduler import PatternScheduler
+from pattern_engine import play_pattern, encode_hsv, CHRISTMAS_COLORS, RAINBOW, BREATHE_WHITE
 """
 IMPORTANT NOTE: Add "self.spidev.max_speed_hz = 4000000" after line 373 ("self.spidev.open(0, csn_pin)")
 in lib_nrf24.py from the library obtained from above to get it working with newer RPis (as of May 2019)
 """
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setwarnings(False)
-
+IRQ_PIN = 0 # BCM pin wired to the NRF24L01+ IRQ pin (0 if not wired: poll for messages every 1 ms instead)
 readPipeAddr = [0xe7, 0xe7, 0xe7, 0xe7, 0xe7]
 writePipeAddr = [0xc2, 0xc2, 0xc2, 0xc2, 0xc2]
 
-radio = NRF24(GPIO, spidev.SpiDev())
-radio.begin(0, 17) # GPIO values passed in
-
-radio.setPayloadSize(32)
-radio.setChannel(125) # Channel possibilities: [0, 125] => [2.400, 2.525] GHz
-radio.setDataRate(NRF24.BR_1MBPS)
-radio.setPALevel(NRF24.PA_MAX)
+# NRF24L01+ radios wired to this RPi: (SPI bus, chip select, CE GPIO pin, IRQ GPIO pin, channel). Each radio gets its own
+# worker process, and should be on its own channel (set CHANNEL in the sketch of the Arduinos it talks to).
+RADIOS = [
+    (0, 0, 17, IRQ_PIN, 125), # SPI0 CE0
+    # (0, 1, 27, 0, 110), # SPI0 CE1
+    # (1, 0, 22, 0, 95), # SPI1 CE0 (dtoverlay=spi1-2cs; SPI1 CE1 is GPIO17, so move the first radio's CE pin to use it)
+]
 
-radio.setAutoAck(True)
-radio.enableDynamicPayloads()
-radio.enableAckPayload() # Sends back 'message received'-type message
-
-radio.openReadingPipe(1, readPipeAddr)
-radio.openWritingPipe(writePipeAddr)
-# radio.printDetails()
+# Arduinos this RPi talks to, one per reading pipe (1-5) of a radio. Each one needs its own NODE_ID (the pipe) in the
+# Arduino sketch. Nodes added without a radio go to the radio with the fewest nodes. The first one added is the one
+# instructions go to by default.
+dispatcher = RadioDispatcher(len(RADIOS))
+dispatcher.add("arduino", 0, 1, readPipeAddr, writePipeAddr)
+# dispatcher.add("arduino 2") # NODE_ID/CHANNEL: see dispatcher.radio_of and the node's pipe
 
 ACK_TIMEOUT = 100 # The amount of time (in ms) that should be spent waiting for an ACK from the Arduino
-transceive_process = None # Child daemon process used to transceive with the Arduino
-pattern_thread = None # Thread used for running multiple transceive_process calls in order to make patterns (ALPHA)
-suppress_daemon_output = Value(c_bool, False) # Used as a flag for the daemon process to know when to suppress its output (e.g., when the main process isn't in the main menu)
-stop_pattern_thread = None # Used for signaling the pattern_thread to stop
+TEMP_IN_ACK = False # True: the Arduino puts its temperature readings in the ACK payloads of our packets instead of sending them (set TEMP_IN_ACK to 1 in the Arduino sketch)
+TELEMETRY_POLL_PERIOD = 3 # With TEMP_IN_ACK, how often (in s) to send a keepalive for a temperature reading when there's nothing else to send
+HARDWARE_ACK = False # True: instructions are confirmed by the NRF24L01+ hardware auto-ack instead of the Arduino echoing them back (set ECHO_ACK to 0 in the Arduino sketch)
+COMMAND_CHECK_INTERVAL = 0.01 # How often (in s) the radio worker checks for a new instruction while sleeping on the IRQ line
+# Hardware retries: up to 15 retransmits 1.25 ms apart per packet (ARC/ARD). Software retries: backoff from 10 ms up to 1 s,
+# giving up on an instruction 30 s after it was first sent (e.g. the Arduino is off or out of range)
+RETRY_POLICY = RetryPolicy(hardware_delay=4, hardware_count=15, base_delay=0.01, max_delay=1.0, deadline=30.0)
+TELEMETRY_LOG = None # Path of a binary log (see telemetry_log.py) the radio worker appends every received packet to (None: don't log; radios after the first log to <TELEMETRY_LOG>.<radio index>)
+
+# Nothing touches the hardware until the first instruction is sent: the radios are set up then, by the radio worker processes
+transceiver = Transceiver(RADIOS, dispatcher, ack_timeout=ACK_TIMEOUT, hardware_ack=HARDWARE_ACK, temp_in_ack=TEMP_IN_ACK,
+                          telemetry_poll_period=TELEMETRY_POLL_PERIOD, command_check_interval=COMMAND_CHECK_INTERVAL, retry_policy=RETRY_POLICY,
+                          telemetry_log=TELEMETRY_LOG, on_temperature=lambda sensor, payload: print_rcvd_temperature(payload, sensor))
+pattern_scheduler = PatternScheduler(lambda b0, b1, b2, b3: send_instruction(b0, b1, b2, b3)) # Plays timed sequences of instructions (patterns) on its own thread
+pattern = None # Sequence currently playing on <pattern_scheduler> (ALPHA)
+suppress_daemon_output = transceiver.suppress_output # Used as a flag for the daemon process to know when to suppress its output (e.g., when the main process isn't in the main menu)
 
 # Convenience color name variables
 OFF = 0
@@ -56,73 +65,17 @@ CYAN = 7
 PINK = 8
 WHITE = 9
   
-def start_new_transceive_process(b0, b1, b2, b3):
-    global transceive_process, suppress_daemon_output
-    # If a previous transceive process is running, terminate/join process
-    if transceive_process is not None and transceive_process.is_alive():
-        transceive_process.terminate()
-        transceive_process.join()
-    transceive_process = Process(target=transceive, args=(b0,b1,b2,b3,suppress_daemon_output,))
-    transceive_process.daemon = True
-    transceive_process.start()      
-
-def transceive(b0, b1, b2, b3, suppress_output):
-    ACK_rcvd = False # Flag for tracking whether or not [b0, b1, b2, b3] was confirmed as received by the Arduino
-    radio.stopListening() # In case previously running transcieve process was listening
-    
-    # Continuously send the instruction message
-    while True:
-        send_message(b0, b1, b2, b3)
-        ACK_rcvd = wait_for_ACK(b0, b1, b2, b3) # Wait <ACK_TIMEOUT> ms for an ACK, update the <ACK_rcvd> flag accordingly
-        if ACK_rcvd: # If ACK received, then break out of the while loop
-            break
-        
-    # Once out of the while loop, this process is done sending messages. Now it just listens for messages (in this case, temperature values).
-    indefinitely_listen_for_messages(suppress_output)
-            
-def send_message(b0, b1, b2, b3):
-    radio.write(bytes([b0, b1, b2, b3]))
-    
-def wait_for_ACK(b0, b1, b2, b3):
-    radio.startListening()
-    start = int(time.time()*1000)
-    while int(time.time()*1000) - start <= ACK_TIMEOUT:
-        while not radio.available(0):
-            time.sleep(1/1000.0)
-        received_message = []
-        radio.read(received_message, radio.getDynamicPayloadSize())
-        if received_message == [b0, b1, b2, b3]: # If the Arduino replies with the same instruction, it has confirmed receipt. Return True.
-            radio.stopListening()
-            return True
-    
-    # If <ACK_TIMEOUT> is reached without confirmation from the Arduino, return False.
-    radio.stopListening()
-    return False
+def send_instruction(b0, b1, b2, b3, node=None):
+    # Hand the instruction for <node> (default: the first node) to its radio's worker process (started on first use).
+    # If the worker hasn't confirmed an earlier instruction for the same node yet, that one is superseded by this one.
+    transceiver.send_instruction(b0, b1, b2, b3, node)
 
-def indefinitely_listen_for_messages(suppress_output):
-    # Now we're indefinitely listening for temperature values from the Arduino
-    # This will end only if the main program is exited, or if the user enters a new non-pattern instruction--prompting the current daemon process to be killed.
-    try:
-        radio.startListening()
-        while True:
-            while not radio.available(0):
-                time.sleep(1/1000.0)
-            received_message = []
-            radio.read(received_message, radio.getDynamicPayloadSize())
-            # Temperature is always sent in two bytes with value range [0, 1023]
-            # If the received_message is two bytes, assume it's a temperature value (and therefore not a four-byte instruction ACK)
-            #print(suppress_output.value)
-            if len(received_message) == 2 and not suppress_output.value: # Print the message to console if output is not suppressed
-                print_rcvd_temperature(received_message)
-    except KeyboardInterrupt:
-        print("\nCtrl+C press detected.")
-
-def print_rcvd_temperature(rcvd_temperature_bytes):
-    raw_val = int.from_bytes(rcvd_temperature_bytes, byteorder="little") - 10
-    if raw_val in range(1024): # If raw_val in range [0, 1023], then it's a valid Arduino raw analog measurement value
-        degC = raw_val * 0.217226044 - 61.1111111 # Convert raw value to degrees C (formula: https://forum.arduino.cc/index.php?topic=152280.0)
-        degF = (degC * 9.0) / 5.0 + 32.0; # Convert degrees C to degrees F
-        string_to_print = "    [Temperature received at "+style_string(str(datetime.datetime.now()), YELLOW)+(": %.1f°C (%.1f°F)]" % (degC, degF))
+def print_rcvd_temperature(rcvd_temperature_bytes, sensor=None):
+    raw_val = decode_raw(rcvd_temperature_bytes)
+    if raw_val is not None:
+        degC, degF = calibration_for(sensor).convert(raw_val) # Precomputed for every raw value (see temperature_conversion.py)
+        source = (" from %s" % sensor) if len(dispatcher.radio_of) > 1 else ""
+        string_to_print = "    [Temperature received"+source+" at "+style_string(str(datetime.datetime.now()), YELLOW)+(": %.1f°C (%.1f°F)]" % (degC, degF))
         print(string_to_print, end="\r", flush=True) # Prints in place instead of multiple lines (flush=True)
     else:
         print(style_string("    [Received invalid raw temperature value (Not in range [0, 1023])", RED), end="\r", flush=True)
@@ -148,18 +101,8 @@ def style_string(string, style):
 def print_invalid_choice():
     print("\nInvalid choice entered. Please enter an integer choice from the list. Try again.")
     
-def signal_check_delay(s):
-    # Function used in place of time.sleep() for pattern threads that checks whether or not we should stop
-    global stop_pattern_thread
-    start = time.time()
-    timeout = s
-    while(time.time() - start < timeout):
-        if stop_pattern_thread:
-            return True
-    return False
-    
 def set_LED_off():
-    start_new_transceive_process(0, 255, 255, 255)
+    send_instruction(0, 255, 255, 255)
     
 def set_LED_RGB():
     while True:
@@ -178,7 +121,7 @@ def set_LED_RGB():
             print("\nPlease enter only integer values from 0 to 255. Try again.")
             continue
     
-    start_new_transceive_process(1, r, g, b)
+    send_instruction(1, r, g, b)
     
 def set_LED_HSV():
     while True:
@@ -199,10 +142,7 @@ def set_LED_HSV():
             print(string_to_print)
             continue
         
-    if h < 104: # h: [0, 103] => b0: [151, 254], b1: DON'T_CARE
-       start_new_transceive_process(h+151, 0, s, v)
-    else: # h: [104, 359] => b0: 255, b1: [0, 255]
-       start_new_transceive_process(255, h-104, s, v)
+    send_instruction(*encode_hsv(h, s, v)) # h: [0, 103] => b0: [151, 254], b1: DON'T_CARE; h: [104, 359] => b0: 255, b1: [0, 255]
     
 def cycle_HSV():
     while True:
@@ -219,36 +159,99 @@ def cycle_HSV():
             string_to_print += " and from 0 to 100 for "+style_string("VALUE (BRIGHTNESS)", CYAN)+". Try again."
             print(string_to_print)
             continue
-    start_new_transceive_process(2, d, 100, v)
+    send_instruction(2, d, 100, v)
     
 def go_gata():
-    start_new_transceive_process(3, 0, 0, 0)
+    send_instruction(3, 0, 0, 0)
     
 def test_color_names():
-    start_new_transceive_process(4, 0, 0, 0)
+    send_instruction(4, 0, 0, 0)
     
 def blink_HSV():
-    start_new_transceive_process(5, 0, 0, 0)
+    send_instruction(5, 0, 0, 0)
     
 def christmas_colors():
-    global pattern_thread
-    pattern_thread = threading.Thread(target=christmas_colors_thread)
-    pattern_thread.start()
-
-def christmas_colors_thread():
-    while True:
-        start_new_transceive_process(1, 255, 0, 0) # red
-        if signal_check_delay(0.5):
-            break
-        start_new_transceive_process(1, 0, 255, 0) # green
-        if signal_check_delay(0.5):
-            break
-        start_new_transceive_process(1, 255, 255, 255) # white
-        if signal_check_delay(0.5):
-            break
+    global pattern
+    pattern = play_pattern(pattern_scheduler, CHRISTMAS_COLORS) # red, green, white
+    
+def rainbow_fade():
+    global pattern
+    pattern = play_pattern(pattern_scheduler, RAINBOW)
     
+def breathe_white():
+    global pattern
+    pattern = play_pattern(pattern_scheduler, BREATHE_WHITE)
+    
+# Batch mode: commands given on the command line, in a file or on stdin (one or more per line, '#' starts a comment):
+#     python3 rpi_arduino_transcieve_rgb_temp.py rgb 255 0 0
+#     python3 rpi_arduino_transcieve_rgb_temp.py "hsv 270 50 100; cycle 20 80" --node arduino
+#     echo "off" | python3 rpi_arduino_transcieve_rgb_temp.py -
+BATCH_COMMANDS = { # Name -> (argument ranges, instruction builder)
+    "off": ((), lambda: (0, 255, 255, 255)),
+    "rgb": ((256, 256, 256), lambda r, g, b: (1, r, g, b)),
+    "hsv": ((360, 101, 101), lambda h, s, v: tuple(encode_hsv(h, s, v))),
+    "cycle": ((256, 101), lambda d, v: (2, d, 100, v)),
+    "gogata": ((), lambda: (3, 0, 0, 0)),
+    "colors": ((), lambda: (4, 0, 0, 0)),
+    "blink": ((), lambda: (5, 0, 0, 0)),
+    "raw": ((256, 256, 256, 256), lambda b0, b1, b2, b3: (b0, b1, b2, b3)),
+}
+BATCH_TIMEOUT = 1.0 # How long (in s) batch mode keeps re-sending a command the Arduino hasn't confirmed
+
+def parse_commands(text):
+    # [(command text, instruction)] for every command in <text>. Raises ValueError on a malformed command.
+    tokens = [token for line in text.splitlines() for token in line.split("#")[0].replace(";", " ").replace(",", " ").split()]
+    commands = []
+    i = 0
+    while i < len(tokens):
+        name = tokens[i].lower()
+        if name not in BATCH_COMMANDS:
+            raise ValueError("Unknown command %r (commands: %s)" % (tokens[i], ", ".join(BATCH_COMMANDS)))
+        ranges, build = BATCH_COMMANDS[name]
+        args = tokens[i+1:i+1+len(ranges)]
+        try:
+            values = [int(arg) for arg in args]
+        except ValueError:
+            values = []
+        if len(values) != len(ranges) or any(value not in range(limit) for value, limit in zip(values, ranges)):
+            usage = " ".join("[0-%d]" % (limit - 1) for limit in ranges)
+            raise ValueError("Usage: %s %s (got %r)" % (name, usage, " ".join(tokens[i:i+1+len(ranges)])))
+        commands.append((" ".join([name] + args), build(*values)))
+        i += 1 + len(ranges)
+    return commands
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(description="Send LED commands without the menu, e.g. 'rgb 255 0 0', 'hsv 270 50 100', 'cycle 20 80'")
+    parser.add_argument("commands", nargs="*", help="commands (%s), or - to read them from stdin" % ", ".join(BATCH_COMMANDS))
+    parser.add_argument("-f", "--file", help="read commands from FILE")
+    parser.add_argument("--node", help="node to send to (default: the first node)")
+    parser.add_argument("--timeout", type=float, default=BATCH_TIMEOUT, help="give up on a command after TIMEOUT s (default: %(default)s)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only report failures")
+    args = parser.parse_args(argv)
+
+    text = " ".join(command for command in args.commands if command != "-")
+    if "-" in args.commands:
+        text += "\n" + sys.stdin.read()
+    if args.file:
+        with open(args.file) as f:
+            text += "\n" + f.read()
+    try:
+        commands = parse_commands(text)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.node is not None and args.node not in dispatcher.radio_of:
+        parser.error("Unknown node %r (nodes: %s)" % (args.node, ", ".join(dispatcher.radio_of)))
+
+    suppress_daemon_output.value = True # Don't print temperatures received in the meantime
+    results = transceiver.run_batch(commands, args.node, args.timeout)
+    for command, confirmed, latency in results:
+        if not (args.quiet and confirmed):
+            status = style_string("OK  ", GREEN) if confirmed else style_string("FAIL", RED)
+            print("%s %-20s %7.1f ms" % (status, command, latency * 1000))
+    return 0 if all(confirmed for command, confirmed, latency in results) else 1
+
 def main():
-    global suppress_daemon_output, pattern_thread, stop_pattern_thread
+    global suppress_daemon_output
     main_menu = """
         Choose an option:
         [0] Turn off LEDs
@@ -259,6 +262,8 @@ def main():
         [5] Test color names
         [6] Blink HSV colors at 60-degree Hue intervals
         [7] Christmas Colors (ALPHA)
+        [8] Rainbow fade (ALPHA)
+        [9] Breathe white (ALPHA)
         Press Ctrl+C to exit.\n
         """
     while True:
@@ -275,31 +280,29 @@ def main():
                 5: test_color_names,
                 6: blink_HSV,
                 7: christmas_colors,
+                8: rainbow_fade,
+                9: breathe_white,
             }
             func = switch.get(choice, print_invalid_choice) # If <choice> isn't in the menu, print invalid choice statement
             suppress_daemon_output.value = True # If a valid function is chosen, suppress daemon output until we're back in the main menu
             
-            # If there's a pattern thread running, terminate it before executing the next choice (as long as the choice was valid)
-            if func != print_invalid_choice and pattern_thread is not None and pattern_thread.is_alive():
-                stop_pattern_thread = True
-                pattern_thread.join()
-                stop_pattern_thread = False
+            # If there's a pattern playing, stop it before executing the next choice (as long as the choice was valid)
+            if func != print_invalid_choice and pattern is not None and pattern.is_alive():
+                pattern.cancel()
             
             func() # Run the corresponding function obtained from <switch> dictionary
         except ValueError:
             print_invalid_choice()
         
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sys.exit(batch_main(sys.argv[1:]))
     try:
         main()
     except KeyboardInterrupt:
         print("\nNow exiting.")
-        # If there's a pattern thread running, terminate it
-        if pattern_thread is not None and pattern_thread.is_alive():
-            stop_pattern_thread = True
-            pattern_thread.join()
-        # If there's a transceive process is running, terminate/join process
-        if transceive_process is not None and transceive_process.is_alive():
-            transceive_process.terminate()
-            transceive_process.join()
+        # If there's a pattern playing, stop it
+        pattern_scheduler.stop()
+        # If radio worker processes are running, terminate/join them
+        transceiver.stop()
         exit(0)
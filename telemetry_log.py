@@ -0,0 +1,208 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Append-only binary log of every packet received from the NRF24L01+.
+#
+# The file is a 16-byte header followed by fixed 48-byte records:
+#     timestamp (float64, s since epoch), pipe (uint8), payload length (uint8), 6 reserved bytes, payload (32 bytes)
+# so months of packets take a fraction of the space of a CSV/print log and any record can be found by offset.
+#
+#     log = TelemetryLogWriter("telemetry.bin")     # Writes are batched on a background thread
+#     log.append(pipe, payload)
+#     log.close()
+#
+#     with TelemetryLogReader("telemetry.bin") as log:
+#         log[-1]                                   # (timestamp, pipe, payload)
+#         log.between(t0, t1)                       # Binary search on the timestamps
+#         log.to_numpy()                            # Zero-copy structured array over the mmap (needs NumPy)
+#
+# Timestamps are kept non-decreasing by the writer (a clock step backwards reuses the last timestamp), which
+# is what makes the binary search valid.
+
+import os
+import mmap
+import time
+import struct
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MAGIC = b"NRF24LOG"
+VERSION = 1
+HEADER = struct.Struct("<8sHH4x")
+RECORD = struct.Struct("<dBB6x32s")
+TIMESTAMP = struct.Struct("<d")
+
+if numpy is not None:
+    RECORD_DTYPE = numpy.dtype([("timestamp", "<f8"), ("pipe", "u1"), ("length", "u1"), ("reserved", "V6"), ("payload", "u1", (32,))])
+else:
+    RECORD_DTYPE = None
+
+
+class TelemetryLogWriter:
+    """Appends packets to a telemetry log; the caller only packs into memory, a thread does the file I/O."""
+
+    def __init__(self, path, flush_interval=5.0, batch_size=256, fsync=False):
+        self.path = path
+        self.flush_interval = flush_interval # Longest time (s) a record waits in memory before being written
+        self.batch_size = batch_size # Records that trigger an early write
+        self.fsync = fsync # Also fsync() after each batch (slower, survives power loss)
+        self.file = open(path, "ab")
+        end = self.file.tell()
+        if end < HEADER.size:
+            if end:
+                self.file.truncate(0) # Crashed while writing the header: there can't be any records yet
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self.file.flush()
+        elif (end - HEADER.size) % RECORD.size:
+            self.file.truncate(end - (end - HEADER.size) % RECORD.size) # Drop a record cut short by a crash
+        self.last_timestamp = _last_timestamp(path)
+        self.buffer = bytearray()
+        self.count = 0 # Records in <buffer>
+        self.written = 0 # Records written to the file by this writer
+        self.lock = threading.Lock() # Guards <buffer>
+        self.write_lock = threading.Lock() # Held from taking a batch to writing it, so batches reach the file in order
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def append(self, pipe, payload, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            if timestamp < self.last_timestamp:
+                timestamp = self.last_timestamp
+            self.last_timestamp = timestamp
+            self.buffer += RECORD.pack(timestamp, pipe, len(payload), bytes(payload))
+            self.count += 1
+            if self.count >= self.batch_size:
+                self.wakeup.set()
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                data, count = self.buffer, self.count
+                self.buffer, self.count = bytearray(), 0
+            if data:
+                self.file.write(data)
+                self.file.flush()
+                if self.fsync:
+                    os.fsync(self.file.fileno())
+                self.written += count
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        self.thread.join()
+        self.flush()
+        self.file.close()
+
+    def _flush_loop(self):
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+
+class TelemetryLogReader:
+    """Read-only view of a telemetry log through mmap. Call refresh() to see records appended since opening."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = None
+        self.map_size = 0 # Bytes mapped
+        self.size = 0
+        self.refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("record index out of range")
+        timestamp, pipe, length, payload = RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size)
+        return timestamp, pipe, payload[:length]
+
+    def __iter__(self):
+        for index in range(self.size):
+            yield self[index]
+
+    def refresh(self):
+        file_size = os.fstat(self.file.fileno()).st_size
+        if file_size < HEADER.size:
+            self.size = 0
+            return
+        if self.map is not None and file_size == self.map_size:
+            return
+        # The previous map isn't closed: to_numpy() arrays may still be viewing it. It's unmapped once they're gone.
+        self.map = mmap.mmap(self.file.fileno(), file_size, access=mmap.ACCESS_READ)
+        self.map_size = file_size
+        magic, version, record_size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError("%s is not a version %d telemetry log" % (self.path, VERSION))
+        self.size = (file_size - HEADER.size) // RECORD.size # A partially written last record is ignored
+
+    def close(self):
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass # to_numpy() arrays still view it: it's unmapped once they're gone
+            self.map = None
+        self.file.close()
+
+    def timestamp(self, index):
+        return TIMESTAMP.unpack_from(self.map, HEADER.size + index * RECORD.size)[0]
+
+    def find(self, t):
+        # Index of the first record with timestamp >= t (len(self) if none)
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def between(self, t0, t1):
+        # Records with t0 <= timestamp < t1
+        return [self[index] for index in range(self.find(t0), self.find(t1))]
+
+    def to_numpy(self, start=0, stop=None):
+        # Structured array (timestamp, pipe, length, reserved, payload) over the mmap, without copying. It stays valid
+        # across refresh() and close() (it keeps the map it views alive) but doesn't see records appended later.
+        if numpy is None:
+            raise ImportError("to_numpy() needs NumPy")
+        if stop is None:
+            stop = self.size
+        if self.map is None or stop <= start:
+            return numpy.zeros(0, dtype=RECORD_DTYPE)
+        return numpy.frombuffer(self.map, dtype=RECORD_DTYPE, count=stop - start, offset=HEADER.size + start * RECORD.size)
+
+
+def _last_timestamp(path):
+    with TelemetryLogReader(path) as log:
+        return log.timestamp(len(log) - 1) if len(log) else 0.0
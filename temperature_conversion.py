@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Raw temperature value -> °C/°F conversion through precomputed lookup tables.
+#
+# The Arduino sends its 10-bit analogRead() value unchanged, as two little-endian bytes; the RPi side subtracts
+# RAW_OFFSET from it (a correction of its own, not something the sketch does). Every possible raw value
+# (0..1023) is converted once per calibration, so converting a reading is a table index, and whole arrays
+# of readings (logs, replays) convert in one NumPy indexing operation when NumPy is installed.
+#
+#     raw = decode_raw(payload)                     # None if out of range
+#     degC, degF = calibration_for("arduino").convert(raw)
+#     set_calibration("kitchen", Calibration(slope=0.2185, intercept=-61.5))
+#     celsius = calibration_for("kitchen").celsius_array(raws)   # NaN where a raw value is out of range
+#
+# Sensors are keyed like everywhere else readings are: by node name (see node_registry.py), or by pipe number
+# for packets from a pipe no node is registered on.
+
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+RAW_OFFSET = 10 # Subtracted from the received value by decode_raw() (the RPi script's long-standing correction, the sketch sends analogRead() as is)
+RAW_RANGE = 1024 # 10-bit ADC
+DEFAULT_SLOPE = 0.217226044 # °C per raw step (formula: https://forum.arduino.cc/index.php?topic=152280.0)
+DEFAULT_INTERCEPT = -61.1111111 # °C at raw value 0
+
+
+class Calibration:
+    """Linear raw -> °C calibration (degC = raw * slope + intercept) with its conversion tables."""
+
+    def __init__(self, slope=DEFAULT_SLOPE, intercept=DEFAULT_INTERCEPT):
+        self.slope = slope
+        self.intercept = intercept
+        self.celsius = array('d', [raw * slope + intercept for raw in range(RAW_RANGE)])
+        self.fahrenheit = array('d', [(degC * 9.0) / 5.0 + 32.0 for degC in self.celsius])
+        if numpy is not None:
+            self.celsius_table = numpy.append(numpy.frombuffer(self.celsius, dtype=numpy.float64), numpy.nan) # Last entry: invalid raw value
+            self.fahrenheit_table = numpy.append(numpy.frombuffer(self.fahrenheit, dtype=numpy.float64), numpy.nan)
+
+    def __repr__(self):
+        return "Calibration(slope=%r, intercept=%r)" % (self.slope, self.intercept)
+
+    def convert(self, raw):
+        # (degC, degF) for one raw value in [0, 1023]
+        return self.celsius[raw], self.fahrenheit[raw]
+
+    def celsius_array(self, raws):
+        return self._convert_array(raws, "celsius")
+
+    def fahrenheit_array(self, raws):
+        return self._convert_array(raws, "fahrenheit")
+
+    def _convert_array(self, raws, scale):
+        # Vectorised table lookup: out-of-range raw values map to NaN. Without NumPy, returns a list.
+        if numpy is None:
+            table = getattr(self, scale)
+            return [table[raw] if 0 <= raw < RAW_RANGE else float("nan") for raw in raws]
+        raws = numpy.asarray(raws)
+        indices = numpy.where((raws >= 0) & (raws < RAW_RANGE), raws, RAW_RANGE)
+        return getattr(self, scale + "_table")[indices]
+
+
+DEFAULT_CALIBRATION = Calibration()
+calibrations = {} # Sensor (node name, or pipe number if unregistered) -> Calibration, for sensors that don't use DEFAULT_CALIBRATION
+
+
+def set_calibration(sensor, calibration):
+    calibrations[sensor] = calibration
+
+def calibration_for(sensor=None):
+    return calibrations.get(sensor, DEFAULT_CALIBRATION)
+
+def decode_raw(payload):
+    # Raw value carried by a 2-byte temperature payload, or None if it isn't in [0, 1023]
+    raw = payload[0] + (payload[1] << 8) - RAW_OFFSET
+    if 0 <= raw < RAW_RANGE:
+        return raw
+    return None
+
+def decode_raw_array(payloads):
+    # Vectorised decode_raw() for an (N, 2+) uint8 array, e.g. TelemetryLogReader.to_numpy()["payload"].
+    # Out-of-range values are returned as -1 (which the *_array() conversions turn into NaN).
+    if numpy is None:
+        raise ImportError("decode_raw_array() needs NumPy")
+    payloads = numpy.asarray(payloads)
+    raws = payloads[:, 0].astype(numpy.int32) + (payloads[:, 1].astype(numpy.int32) << 8) - RAW_OFFSET
+    raws[(raws < 0) | (raws >= RAW_RANGE)] = -1
+    return raws
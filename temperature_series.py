@@ -0,0 +1,214 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Compact in-memory time series for the temperature readings received from the Arduino(s).
+#
+# Samples are kept as (timestamp, raw value) in fixed-size ring buffers backed by array.array
+# (8 + 2 bytes per sample), so days of readings from several sensors fit in a few MB. Alongside the raw
+# ring, min/mean/max aggregates are maintained incrementally for each configured resolution, so
+# dashboard-style queries ("hourly min/mean/max for the last week") never rescan the raw samples.
+#
+#     series = TemperatureStore()
+#     series.record("arduino", raw_val)            # raw 10-bit value, timestamp defaults to time.time()
+#     series["arduino"].last(10)                   # [(timestamp, raw), ...]
+#     series["arduino"].between(t0, t1)
+#     series["arduino"].aggregate(3600, t0, t1)    # [(bucket_start, min, mean, max, count), ...]
+#
+# Values are stored exactly as received (raw analogRead() units); converting to degrees is left to the
+# caller. If NumPy is installed, to_numpy() gives zero-copy views of the raw samples.
+
+import time
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+DEFAULT_CAPACITY = 7 * 24 * 60 * 20 # One week of samples every 3 s
+DEFAULT_RESOLUTIONS = (60, 3600, 86400) # Aggregate bucket sizes (in s)
+
+
+class _Buckets:
+    # Ring of aggregate buckets for one resolution
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.start = array('d', [0.0]) * capacity
+        self.count = array('L', [0]) * capacity
+        self.total = array('d', [0.0]) * capacity
+        self.low = array('H', [0]) * capacity
+        self.high = array('H', [0]) * capacity
+        self.head = -1 # Index of the newest bucket
+        self.size = 0
+
+    def add(self, timestamp, value):
+        bucket_start = timestamp - timestamp % self.resolution
+        i = self.head
+        if self.size and self.start[i] == bucket_start:
+            self.count[i] += 1
+            self.total[i] += value
+            if value < self.low[i]:
+                self.low[i] = value
+            if value > self.high[i]:
+                self.high[i] = value
+            return
+        if self.size and bucket_start < self.start[i]:
+            return # Out of order sample for a bucket that's already closed, raw ring still has it
+        i = self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.start[i] = bucket_start
+        self.count[i] = 1
+        self.total[i] = value
+        self.low[i] = self.high[i] = value
+
+    def covers(self, t):
+        # True if every sample from <t> on went into buckets still in the ring (it hasn't wrapped past <t>)
+        if self.size < self.capacity:
+            return True
+        return self.start[(self.head + 1) % self.capacity] <= t # Oldest bucket
+
+    def query(self, t0, t1):
+        results = []
+        first = (self.head - self.size + 1) % self.capacity
+        lo = _bisect(self.start, first, self.size, self.capacity, t0 - t0 % self.resolution)
+        for k in range(lo, self.size):
+            i = (first + k) % self.capacity
+            if self.start[i] >= t1:
+                break
+            results.append((self.start[i], self.low[i], self.total[i] / self.count[i], self.high[i], self.count[i]))
+        return results
+
+
+def _bisect(timestamps, first, size, capacity, t):
+    # Leftmost logical index (0 = oldest) in a ring of sorted timestamps with timestamps[index] >= t
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if timestamps[(first + mid) % capacity] < t:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class TemperatureSeries:
+    """Ring buffer of (timestamp, raw value) samples for one sensor, with incremental aggregates."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, resolutions=DEFAULT_RESOLUTIONS, bucket_capacity=None):
+        self.capacity = capacity
+        self.timestamps = array('d', [0.0]) * capacity
+        self.values = array('H', [0]) * capacity
+        self.head = -1 # Index of the newest sample
+        self.size = 0
+        self.buckets = {}
+        for resolution in resolutions:
+            # By default keep as many buckets as the raw ring spans at 3 s per sample (and at least a year of days)
+            count = bucket_capacity or max(366, int(capacity * 3 // resolution) + 1)
+            self.buckets[resolution] = _Buckets(resolution, count)
+
+    def __len__(self):
+        return self.size
+
+    def record(self, value, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        if self.size and timestamp < self.timestamps[self.head]:
+            timestamp = self.timestamps[self.head] # Keep the ring sorted (clock stepped back)
+        i = self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.timestamps[i] = timestamp
+        self.values[i] = value
+        for buckets in self.buckets.values():
+            buckets.add(timestamp, value)
+
+    def _first(self):
+        return (self.head - self.size + 1) % self.capacity
+
+    def last(self, n=1):
+        # Newest <n> samples, oldest first
+        n = min(n, self.size)
+        first = self._first()
+        return [(self.timestamps[(first + k) % self.capacity], self.values[(first + k) % self.capacity])
+                for k in range(self.size - n, self.size)]
+
+    def latest(self):
+        if not self.size:
+            return None
+        return self.timestamps[self.head], self.values[self.head]
+
+    def between(self, t0, t1):
+        # Samples with t0 <= timestamp < t1, found by binary search
+        first = self._first()
+        lo = _bisect(self.timestamps, first, self.size, self.capacity, t0)
+        hi = _bisect(self.timestamps, first, self.size, self.capacity, t1)
+        return [(self.timestamps[(first + k) % self.capacity], self.values[(first + k) % self.capacity])
+                for k in range(lo, hi)]
+
+    def aggregate(self, resolution, t0=0.0, t1=float("inf")):
+        # [(bucket_start, min, mean, max, count)] for the buckets overlapping [t0, t1)
+        if resolution not in self.buckets:
+            raise ValueError("No aggregates kept at resolution %r (have %s)" % (resolution, sorted(self.buckets)))
+        return self.buckets[resolution].query(t0, t1)
+
+    def summary(self, t0=0.0, t1=float("inf")):
+        # (min, mean, max, count) over [t0, t1), from the coarsest buckets that fit inside the range (and still
+        # reach back to its start: with sparse samples a bucket ring can wrap before the raw ring) plus raw samples
+        # at the edges
+        if not self.size:
+            return None
+        t1 = min(t1, self.timestamps[self.head] + 1e-6)
+        parts = []
+        for resolution in sorted(self.buckets, reverse=True):
+            inner0 = -(-t0 // resolution) * resolution
+            inner1 = t1 // resolution * resolution
+            if inner1 > inner0 and self.buckets[resolution].covers(inner0):
+                parts = [(low, mean * count, high, count)
+                         for start, low, mean, high, count in self.aggregate(resolution, inner0, inner1)]
+                edges = self.between(t0, inner0) + self.between(inner1, t1)
+                break
+        else:
+            edges = self.between(t0, t1)
+        if edges:
+            values = [value for timestamp, value in edges]
+            parts.append((min(values), sum(values), max(values), len(values)))
+        if not parts:
+            return None
+        count = sum(part[3] for part in parts)
+        return min(part[0] for part in parts), sum(part[1] for part in parts) / count, \
+            max(part[2] for part in parts), count
+
+    def to_numpy(self):
+        # (timestamps, values) as NumPy arrays in time order (zero-copy unless the ring has wrapped)
+        if numpy is None:
+            raise ImportError("to_numpy() needs NumPy")
+        timestamps = numpy.frombuffer(self.timestamps, dtype=numpy.float64)
+        values = numpy.frombuffer(self.values, dtype=numpy.uint16)
+        first = self._first()
+        if first + self.size <= self.capacity:
+            return timestamps[first:first + self.size], values[first:first + self.size]
+        return numpy.concatenate((timestamps[first:], timestamps[:self.head + 1])), \
+            numpy.concatenate((values[first:], values[:self.head + 1]))
+
+
+class TemperatureStore:
+    """TemperatureSeries per sensor (e.g. per node or pipe), created on first use."""
+
+    def __init__(self, **series_options):
+        self.series_options = series_options
+        self.series = {}
+
+    def __getitem__(self, sensor):
+        if sensor not in self.series:
+            self.series[sensor] = TemperatureSeries(**self.series_options)
+        return self.series[sensor]
+
+    def __contains__(self, sensor):
+        return sensor in self.series
+
+    def sensors(self):
+        return list(self.series)
+
+    def record(self, sensor, value, timestamp=None):
+        self[sensor].record(value, timestamp)
@@ -0,0 +1,387 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Transceiver: everything the RPi script does with the radio(s), as an object.
+#
+# Creating a Transceiver doesn't touch the hardware: each radio is set up on first use, and the GPIO module,
+# the spidev implementation or the NRF24 objects themselves can be injected (e.g. the emulator's):
+#
+#     transceiver = Transceiver()                                       # RPi.GPIO + spidev, radio on SPI0 CE0, CE GPIO17
+#     transceiver.send_instruction(1, 255, 0, 0)                        # Through a radio worker process
+#     transceiver.run_batch([("rgb 255 0 0", (1, 255, 0, 0))])          # From this process
+#
+#     transceiver = Transceiver(gpio=EmulatedGPIO(), spidev_factory=lambda: EmulatedSpiDev(air))
+#     transceiver = Transceiver(radios=[radio])                         # Already set up NRF24
+#
+# The protocol is the one arduino_rpi_transcieve_rgb_temp.ino speaks: 4-byte instructions, confirmed by the
+# Arduino echoing them back (or by the hardware auto-ack with <hardware_ack>), and 2-byte temperature readings.
+
+import time
+import queue
+from ctypes import c_bool, c_ulong
+from multiprocessing import Process, Queue, Value
+
+from lib_nrf24 import NRF24
+from node_registry import RadioDispatcher
+from link_quality import LinkQuality
+from retry_policy import DEFAULT_POLICY
+from telemetry_log import TelemetryLogWriter
+
+
+# (SPI bus, chip select, CE GPIO pin, IRQ GPIO pin (0: not wired), channel) of the default radio
+DEFAULT_RADIO = (0, 0, 17, 0, 125)
+KEEPALIVE = bytes([0, 0, 0, 0]) # An all-zero instruction is ignored by the Arduino (it's what a weak signal looks like)
+STOP = None # Queued by stop(): the radio worker exits once it's done with the instruction it's sending
+
+
+class Transceiver:
+    def __init__(self, radio_configs=(DEFAULT_RADIO,), dispatcher=None, gpio=None, spidev_factory=None, radios=None,
+                 ack_timeout=100, hardware_ack=False, temp_in_ack=False, telemetry_poll_period=3,
+                 command_check_interval=0.01, telemetry_log=None, on_temperature=None, on_result=None, retry_policy=DEFAULT_POLICY,
+                 on_outcome=None, link_quality=True, on_link=None):
+        if radios is not None:
+            radio_configs = [None] * len(radios)
+        self.radio_configs = list(radio_configs) # Per radio: (SPI bus, chip select, CE pin, IRQ pin, channel)
+        if dispatcher is None:
+            dispatcher = RadioDispatcher(len(self.radio_configs))
+            dispatcher.add("arduino", 0, 1) # The sketch's NODE_ID 1
+        self.dispatcher = dispatcher
+        self.gpio = gpio # GPIO module (None: RPi.GPIO, imported on first use)
+        self.spidev_factory = spidev_factory # Returns a new spidev object (None: spidev.SpiDev, imported on first use)
+        self.radios = list(radios) if radios is not None else [None] * len(self.radio_configs) # Set up on first use
+        self.index = 0 # Radio that transceive() and friends use (each radio worker process points it at its own radio)
+        self.ack_timeout = ack_timeout # The amount of time (in ms) that should be spent waiting for an ACK from the Arduino
+        self.hardware_ack = hardware_ack # Instructions are confirmed by the hardware auto-ack instead of the Arduino echoing them back
+        self.temp_in_ack = temp_in_ack # The Arduino puts its temperature readings in the ACK payloads of our packets
+        self.telemetry_poll_period = telemetry_poll_period # With <temp_in_ack>, how often (in s) to send a keepalive when there's nothing else to send
+        self.command_check_interval = command_check_interval # How often (in s) a radio worker checks for a new instruction while sleeping on the IRQ line
+        self.telemetry_log_path = telemetry_log # Binary log every received packet is appended to (radios after the first log to <path>.<radio index>)
+        self.telemetry_log = None # TelemetryLogWriter, opened by the radio worker
+        self.on_temperature = on_temperature # Called as on_temperature(sensor, payload) for every temperature packet, unless output is suppressed
+        self.on_result = on_result # Called as on_result(node, instruction, confirmed, coalesced) by the radio workers after every attempt at an instruction
+        self.retry_policy = retry_policy # Hardware (ARD/ARC) and software (backoff, give-up) retries, see retry_policy.py
+        self.on_outcome = on_outcome # Called as on_outcome(node, instruction, confirmed, attempts, elapsed s) once an instruction is confirmed or given up on
+        self.suppress_output = Value(c_bool, False) # Set to keep radio workers from calling <on_temperature>
+        self.coalesced = Value(c_ulong, 0) # Instructions superseded by a newer one for the same node before they were confirmed (all radios)
+        self.given_up = Value(c_ulong, 0) # Instructions dropped by <retry_policy> without being confirmed (all radios)
+        self.track_link = link_quality # Read OBSERVE_TX after every write and RPD when packets come in (one SPI transfer each)
+        self.link_quality = LinkQuality() # Retransmits, losses and received signal strength, per node (see link_quality.py)
+        self.on_link = on_link # Called as on_link(node, retransmits, lost, rpd) for every packet sent (rpd None) or received (retransmits, lost None)
+        self.lost_packets = {} # Radio index -> PLOS_CNT after the last write
+        self.worker_processes = {} # Radio index -> child daemon process that owns the radio and transceives with its Arduinos
+        self.command_queues = {} # Radio index -> queue of (node name, instruction) for its worker process
+
+    # Radios
+
+    @property
+    def radio(self):
+        return self.get_radio(self.index)
+
+    @property
+    def nodes(self):
+        return self.dispatcher.nodes(self.index)
+
+    def use_radio(self, index):
+        # Point <radio> and <nodes> (used by transceive() and friends) at radio <index>
+        self.index = index
+        return self.radio
+
+    def get_radio(self, index=0):
+        if self.radios[index] is None:
+            self.radios[index] = self.setup_radio(index)
+        return self.radios[index]
+
+    def setup_radio(self, index):
+        bus, csn_pin, ce_pin, irq_pin, channel = self.radio_configs[index]
+        radio = NRF24(self._gpio(), self._spidev())
+        radio.begin(csn_pin, ce_pin, bus) # GPIO values passed in
+
+        radio.setPayloadSize(32)
+        radio.setChannel(channel) # Channel possibilities: [0, 125] => [2.400, 2.525] GHz
+        radio.setDataRate(NRF24.BR_1MBPS)
+        radio.setPALevel(NRF24.PA_MAX)
+
+        radio.setAutoAck(True)
+        radio.enableDynamicPayloads()
+        radio.enableAckPayload() # Sends back 'message received'-type message
+
+        self.retry_policy.apply(radio) # ARD/ARC
+        radio.enableRegisterCache() # Config registers are written through a shadow copy (single SPI writes instead of read-modify-write)
+        self.dispatcher.nodes(index).open(radio) # One reading pipe per node, writing pipe on the first node
+        if irq_pin:
+            radio.enableIRQ(irq_pin) # Sleep on the IRQ line instead of polling STATUS every 1 ms
+        # radio.printDetails()
+        return radio
+
+    def _gpio(self):
+        if self.gpio is None:
+            import RPi.GPIO as GPIO
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setwarnings(False)
+            self.gpio = GPIO
+        return self.gpio
+
+    def _spidev(self):
+        if self.spidev_factory is None:
+            import spidev
+            self.spidev_factory = spidev.SpiDev
+        return self.spidev_factory()
+
+    # Radio worker processes
+
+    def send_instruction(self, b0, b1, b2, b3, node=None):
+        # Hand the instruction for <node> (default: the first node) to its radio's worker process (started on first use).
+        # If the worker hasn't confirmed an earlier instruction for the same node yet, that one is superseded by this one.
+        index = self.dispatcher.radio_for(node) # KeyError for an unknown node
+        node = self.dispatcher.nodes(index).get(node).name
+        self.start_worker(index)
+        self.command_queues[index].put((node, (b0, b1, b2, b3)))
+
+    def start(self):
+        # Start every radio's worker process now (e.g. to receive temperatures before anything is sent)
+        for index in range(len(self.radios)):
+            self.start_worker(index)
+
+    def start_worker(self, index):
+        worker = self.worker_processes.get(index)
+        if worker is None or not worker.is_alive():
+            self.command_queues[index] = Queue()
+            worker = self.worker_processes[index] = Process(target=self.radio_worker, args=(self.command_queues[index], index,))
+            worker.daemon = True
+            worker.start()
+
+    def stop(self, timeout=None):
+        # Stop the radio worker processes. Each one finishes the transfer it's in the middle of first; one that's
+        # still running after <timeout> s (default: a little over <ack_timeout>) is terminated.
+        if timeout is None:
+            timeout = self.ack_timeout / 1000.0 + 1
+        for index, worker in self.worker_processes.items():
+            if worker.is_alive():
+                self.command_queues[index].put(STOP)
+        deadline = time.monotonic() + timeout
+        for worker in self.worker_processes.values():
+            worker.join(max(0, deadline - time.monotonic()))
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+    def radio_worker(self, commands, index=0):
+        # Long-lived process that owns radio <index>: it sends each node's instruction until that Arduino ACKs it
+        # (switching to a newer instruction for the node as soon as one is queued) and listens for messages in between.
+        # A transfer is never cut short: newer instructions and stop() are only looked at between transceive() calls.
+        # Unconfirmed instructions are retried with backoff and eventually given up on, as <retry_policy> says.
+        radio = self.use_radio(index)
+        if self.telemetry_log_path:
+            self.telemetry_log = TelemetryLogWriter(self.telemetry_log_path if index == 0 else "%s.%d" % (self.telemetry_log_path, index))
+        try:
+            radio.resync() # The shadow registers may have been copied at fork time
+            radio.startListening()
+            pending = {} # Node name -> newest unconfirmed instruction
+            coalesced = {} # Node name -> instructions superseded since the last on_result() for the node
+            attempts = {} # Node name -> [instruction, attempts, time of the first attempt, time the next attempt is due]
+            last_send = 0
+            running = True
+            while running:
+                running = self.next_instructions(commands, pending, coalesced=coalesced)
+                sent = False
+                for node, instruction in list(pending.items()): # Take turns between nodes
+                    if not running:
+                        break
+                    state = attempts.get(node)
+                    if state is None or state[0] != instruction: # New instruction for the node
+                        state = attempts[node] = [instruction, 0, time.monotonic(), 0]
+                    elif time.monotonic() < state[3]:
+                        continue # Backing off
+                    sent = True
+                    last_send = time.time()
+                    confirmed = self.transceive(*instruction, node=node)
+                    state[1] += 1
+                    if self.on_result is not None:
+                        self.on_result(node, instruction, confirmed, coalesced.pop(node, 0))
+                    elapsed = time.monotonic() - state[2]
+                    if confirmed or self.retry_policy.gives_up(state[1], elapsed):
+                        if not confirmed:
+                            with self.given_up.get_lock():
+                                self.given_up.value += 1
+                        if self.on_outcome is not None:
+                            self.on_outcome(node, instruction, confirmed, state[1], elapsed)
+                        del attempts[node]
+                        if pending.get(node) == instruction:
+                            del pending[node]
+                    else:
+                        state[3] = time.monotonic() + self.retry_policy.backoff(state[1])
+                    running = self.next_instructions(commands, pending, coalesced=coalesced)
+                if sent or not running:
+                    continue # (not running: stop() was called, don't let the wait below overwrite that)
+
+                # Nothing to send (or every node is backing off): handle what's been received, then wait for the radio or a new instruction
+                packets = radio.drain()
+                self.sample_rpd(packets)
+                self.handle_received_messages(packets)
+                if self.temp_in_ack and time.time() - last_send >= self.telemetry_poll_period:
+                    last_send = time.time()
+                    self.poll_telemetry()
+                if radio.irq_pin:
+                    radio.waitForIRQ(self.command_check_interval)
+                else:
+                    running = self.next_instructions(commands, pending, 1/1000.0, coalesced)
+        except KeyboardInterrupt:
+            print("\nCtrl+C press detected.")
+        finally:
+            if self.telemetry_log is not None:
+                self.telemetry_log.close()
+
+    def next_instructions(self, commands, pending, timeout=0, coalesced=None):
+        # Move the queued instructions into <pending>, keeping only the newest one per node (older ones are stale and
+        # are counted in <coalesced> and <self.coalesced>), waiting up to <timeout> s for one.
+        # Returns False once stop() has been called.
+        superseded = 0
+        try:
+            command = commands.get(timeout=timeout) if timeout else commands.get_nowait()
+            while command is not STOP:
+                node, instruction = command
+                node = self.nodes.get(node).name
+                if node in pending:
+                    superseded += 1
+                    if coalesced is not None:
+                        coalesced[node] = coalesced.get(node, 0) + 1
+                pending[node] = instruction
+                command = commands.get_nowait()
+            return False
+        except queue.Empty:
+            return True
+        finally:
+            if superseded:
+                with self.coalesced.get_lock():
+                    self.coalesced.value += superseded
+
+    # Transceiving (on <radio>)
+
+    def run_batch(self, commands, node=None, timeout=1.0):
+        # Send [(command text, instruction)] back to back from this process (no worker process), each until the Arduino
+        # confirms it or <timeout> s pass. Returns [(command text, confirmed, latency in s)].
+        self.use_radio(self.dispatcher.radio_for(node))
+        results = []
+        for command, instruction in commands:
+            start = time.monotonic()
+            while True:
+                confirmed = self.transceive(*instruction, node=node)
+                if confirmed or time.monotonic() - start >= timeout:
+                    break
+            results.append((command, confirmed, time.monotonic() - start))
+        return results
+
+    def transceive(self, b0, b1, b2, b3, node=None):
+        # Send the instruction to <node> (default: the first node) and wait up to <ack_timeout> ms for the Arduino to confirm it.
+        # Returns True if it did. The radio is left listening either way.
+        radio = self.radio
+        self.stop_listening()
+        node = self.nodes.select(radio, node) # Writing pipe -> <node>
+        if self.hardware_ack:
+            ACK_rcvd = self.send_with_hardware_ACK(b0, b1, b2, b3, node)
+        else:
+            self.send_message(b0, b1, b2, b3, node)
+            ACK_rcvd = self.wait_for_ACK(b0, b1, b2, b3, node) # Wait <ack_timeout> ms for an ACK, update the <ACK_rcvd> flag accordingly
+        radio.startListening()
+        return ACK_rcvd
+
+    def send_with_hardware_ACK(self, b0, b1, b2, b3, node=None):
+        # Send until the Arduino's NRF24L01+ auto-acks the packet (radio.write() returns tx_ok) or <ack_timeout> ms pass.
+        # One air round trip per attempt, no role switches. Anything riding in the ACK payload is handled like a received message.
+        radio = self.radio
+        start = int(time.time()*1000)
+        while True:
+            if self.write(bytes([b0, b1, b2, b3]), node):
+                if radio.isAckPayloadAvailable():
+                    self.handle_received_messages(self.from_ack_pipe(radio.drain(), node))
+                return True
+            if int(time.time()*1000) - start >= self.ack_timeout:
+                return False
+
+    def poll_telemetry(self):
+        # <temp_in_ack> keepalive: send every node something it ignores just to get its temperature back in the ACK payload
+        radio = self.radio
+        self.stop_listening()
+        for node in self.nodes:
+            self.nodes.select(radio, node.name)
+            if self.write(KEEPALIVE, node) and radio.isAckPayloadAvailable():
+                self.handle_received_messages(self.from_ack_pipe(radio.drain(), node))
+        radio.startListening()
+
+    def stop_listening(self):
+        # radio.stopListening() without its flush_rx(): whatever came in since the last drain() was already acked by the
+        # hardware, so the Arduino won't send it again. Handle it instead (like AsyncNRF24._send() does).
+        radio = self.radio
+        packets = radio.drain()
+        self.sample_rpd(packets) # While still in RX mode (leaving it resets RPD)
+        radio.ce(NRF24.LOW)
+        radio.flush_tx()
+        packets += radio.drain() # Anything that landed in between
+        self.handle_received_messages(packets)
+
+    @staticmethod
+    def from_ack_pipe(packets, node):
+        # ACK payloads arrive on pipe 0 (the pipe the auto-ack comes back on): they're from the node we just sent to
+        if node is None:
+            return packets
+        return [(node.pipe if pipe == 0 else pipe, received_message) for pipe, received_message in packets]
+
+    def send_message(self, b0, b1, b2, b3, node=None):
+        self.write(bytes([b0, b1, b2, b3]), node)
+
+    def write(self, payload, node=None):
+        # radio.write() to <node> (a Node), recording how it went from OBSERVE_TX. Returns True if the packet was acked.
+        radio = self.radio
+        acked = radio.write(payload)
+        if self.track_link and node is not None:
+            lost_packets, retransmits = radio.observeTx()
+            lost = lost_packets > self.lost_packets.get(self.index, 0)
+            if lost_packets == 15:
+                radio.resetLostPackets() # PLOS_CNT saturates at 15
+                lost_packets = 0
+            self.lost_packets[self.index] = lost_packets
+            self.record_link(node.name, retransmits=retransmits, lost=lost)
+        return acked
+
+    def sample_rpd(self, packets):
+        # Record whether <packets>, just received while listening, came in above -64 dBm (RPD latches on reception)
+        if not (self.track_link and packets):
+            return
+        rpd = bool(self.radio.testRPD())
+        for name in {node.name for node in (self.nodes.pipes.get(pipe) for pipe, received_message in packets) if node is not None}:
+            self.record_link(name, rpd=rpd)
+
+    def record_link(self, name, retransmits=None, lost=None, rpd=None):
+        self.link_quality.record(name, retransmits, lost, rpd)
+        if self.on_link is not None:
+            self.on_link(name, retransmits, lost, rpd)
+
+    def wait_for_ACK(self, b0, b1, b2, b3, node=None):
+        radio = self.radio
+        radio.startListening()
+        start = int(time.time()*1000)
+        while int(time.time()*1000) - start <= self.ack_timeout:
+            packets = self.from_ack_pipe(radio.waitDrain((self.ack_timeout - (int(time.time()*1000) - start)) / 1000.0), node)
+            if not packets:
+                break
+            self.sample_rpd(packets)
+            self.handle_received_messages(packets) # The whole batch, echo included (e.g. a temperature; temp_in_ack: from the ACK payload of our instruction)
+            for pipe, received_message in packets:
+                if received_message == bytes([b0, b1, b2, b3]) and (node is None or pipe == node.pipe): # If the Arduino replies with the same instruction, it has confirmed receipt. Return True.
+                    self.stop_listening()
+                    return True
+
+        # If <ack_timeout> is reached without confirmation from the Arduino, return False.
+        self.stop_listening()
+        return False
+
+    def handle_received_messages(self, packets):
+        for pipe, received_message in packets: # Everything queued in the RX FIFO since the last wakeup
+            if self.telemetry_log is not None:
+                self.telemetry_log.append(pipe, received_message) # Only packs the record, the file is written in batches
+            # Temperature is always sent in two bytes with value range [0, 1023]
+            # If the received_message is two bytes, assume it's a temperature value (and therefore not a four-byte instruction ACK)
+            if len(received_message) == 2:
+                sensor = self.nodes.name_for(pipe)
+                if self.on_temperature is not None and not self.suppress_output.value:
+                    self.on_temperature(sensor, received_message)